@@ -1,15 +1,17 @@
 import streamlit as st
 from datetime import datetime, time
-from notion_client import Client
 import os
 from dotenv import load_dotenv
+import metrics
+import outbox
+import outbox_flusher
+import posting
+import sinks
+from notion_store import create_notion_page, is_configured
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
 
-# Notionクライアントの初期化
-notion = Client(auth=os.getenv("NOTION_TOKEN"))
-
 # ページ設定
 st.set_page_config(
     page_title="インターン情報生成ツール",
@@ -263,84 +265,42 @@ def generate_intern_info(company, industry, work_type, location, nearest_station
 ### 募集人数
 {capacity}名
 """
-    return {
-        "インターン名": intern_name,
-        "説明": description,
-        "期間": period,
-        "企業名": company,
-        "業界": industry,
-        "形式": work_type,
-        "勤務地": location,
-        "最寄り駅": nearest_station,
-        "職種": position,
-        "募集対象": grade,
-        "報酬": salary,
-        "交通費": transportation_fee,
-        "勤務可能時間": working_hours,
-        "勤務日数": working_days,
-        "勤務時間": working_time_per_week,
-        "選考フロー": selection_process,
-        "応募締切": deadline,
-        "開始予定日": start_date,
-        "募集人数": capacity,
-        "必須スキル": required_skills,
-        "歓迎スキル": skills
-    }
-
-def create_notion_page(info):
-    """Notionにページを作成する関数"""
-    try:
-        # ページのプロパティを設定
-        properties = {
-            "インターン名": {"title": [{"text": {"content": info["インターン名"]}}]},
-            "企業名": {"rich_text": [{"text": {"content": info["企業名"]}}]},
-            "業界": {"select": {"name": info["業界"]}},
-            "形式": {"select": {"name": info["形式"]}},
-            "勤務地": {"rich_text": [{"text": {"content": info["勤務地"]}}]},
-            "最寄り駅": {"rich_text": [{"text": {"content": info["最寄り駅"]}}]},
-            "期間": {"select": {"name": info["期間"]}},
-            "職種": {"select": {"name": info["職種"]}},
-            "募集対象": {"rich_text": [{"text": {"content": info["募集対象"]}}]},
-            "報酬": {"rich_text": [{"text": {"content": info["報酬"]}}]},
-            "交通費": {"rich_text": [{"text": {"content": info["交通費"]}}]},
-            "勤務可能時間": {"rich_text": [{"text": {"content": info["勤務可能時間"]}}]},
-            "勤務日数": {"rich_text": [{"text": {"content": info["勤務日数"]}}]},
-            "勤務時間": {"rich_text": [{"text": {"content": info["勤務時間"]}}]},
-            "選考フロー": {"rich_text": [{"text": {"content": info["選考フロー"]}}]},
-            "応募締切": {"date": {"start": info["応募締切"]}},
-            "開始予定日": {"date": {"start": info["開始予定日"]}},
-            "募集人数": {"number": int(info["募集人数"])},
-            "必須スキル": {"rich_text": [{"text": {"content": info["必須スキル"]}}]},
-            "歓迎スキル": {"rich_text": [{"text": {"content": info["歓迎スキル"]}}]},
-        }
-
-        # ページのコンテンツを設定
-        children = [
-            {
-                "object": "block",
-                "type": "paragraph",
-                "paragraph": {
-                    "rich_text": [{"type": "text", "text": {"content": info["説明"]}}]
-                }
-            }
-        ]
-
-        # Notionにページを作成
-        new_page = notion.pages.create(
-            parent={"database_id": os.getenv("NOTION_DATABASE_ID")},
-            properties=properties,
-            children=children
-        )
-        
-        return True, new_page["url"]
-    except Exception as e:
-        return False, str(e)
+    return posting.Posting(
+        インターン名=intern_name,
+        説明=description,
+        期間=period,
+        企業名=company,
+        業界=industry,
+        形式=work_type,
+        勤務地=location,
+        最寄り駅=nearest_station,
+        職種=position,
+        募集対象=grade,
+        報酬=salary,
+        交通費=transportation_fee,
+        勤務可能時間=working_hours,
+        勤務日数=working_days,
+        勤務時間=working_time_per_week,
+        選考フロー=selection_process,
+        応募締切=deadline,
+        開始予定日=start_date,
+        募集人数=capacity,
+        必須スキル=required_skills,
+        歓迎スキル=skills
+    )
 
 def main():
     # セッション状態の初期化
     if 'info' not in st.session_state:
         st.session_state.info = None
     
+    # 送信箱の自動送信を開始（プロセスごとに1回だけ。この画面ではNotionだけに送信する）
+    outbox_flusher.start_outbox_flusher((outbox.SINK_NOTION,))
+    
+    # APIの計測結果の公開（METRICS_PORT が設定されている場合のみ）と管理者メニュー
+    metrics.start_server_from_env()
+    metrics.show_admin_panel()
+    
     # ヘッダー
     st.markdown("""
     <div style='text-align: center; margin-bottom: 30px;'>
@@ -442,7 +402,7 @@ def main():
             st.code(info['説明'], language="text")
             
             # Notionに送信するかどうかのチェックボックス
-            if os.getenv("NOTION_TOKEN") and os.getenv("NOTION_DATABASE_ID"):
+            if is_configured():
                 if st.checkbox("Notionに送信する"):
                     success, result = create_notion_page(info)
                     if success:
@@ -451,6 +411,28 @@ def main():
                         st.error(f"⚠️ Notionへの送信に失敗しました: {result}")
         else:
             st.error("⚠️ 必須項目（企業名、勤務地、必須スキル）を入力してください。")
+    
+    # 複数のインターン情報をまとめてNotionに送信
+    if st.session_state.info and is_configured():
+        st.markdown("### Notionへの一括送信")
+        if st.button("生成したインターン情報を送信リストに追加"):
+            # 送信箱に書き込むので、ページを再読み込みしても失われない
+            outbox.enqueue([st.session_state.info], outbox.SINK_NOTION)
+        
+        pending = outbox.pending_count(outbox.SINK_NOTION)
+        if pending:
+            st.write(f"送信リスト: {pending}件（未送信のものは自動で再試行します）")
+            if st.button("送信リストをまとめてNotionに送信"):
+                with st.spinner("Notionに送信中..."):
+                    # 再試行待ちのものも含めて今すぐ送信する
+                    sent = outbox_flusher.flush_sink_entries(sinks.NotionSink(), outbox.pending_ids(outbox.SINK_NOTION))
+                for number, (success, result) in enumerate(sent, 1):
+                    if success:
+                        st.success(f"✅ {number}件目: [ページを開く]({result})")
+                    elif success is None:
+                        st.info(f"🔄 {number}件目: {result}")
+                    else:
+                        st.error(f"⚠️ {number}件目: {result}")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -1,19 +1,23 @@
 import streamlit as st
 from datetime import datetime, time
 import os
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
-import pandas as pd
-
-# ページ設定
-st.set_page_config(
-    page_title="インターン情報自動作成ツール",
-    page_icon="🎓",
-    layout="wide"
-)
-
-# カスタムCSSの追加
-st.markdown("""
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import export
+import intern_info
+import metrics
+import near_duplicates
+import outbox
+import outbox_flusher
+import sheets_store
+import sinks
+
+# google-api-python-client / google-auth / pandas は読み込みに時間がかかるため、
+# 初回起動を速くするために実際に使う関数の中で読み込む
+
+# カスタムCSS
+PAGE_CSS = """
 <style>
     .main {
         background-color: #f8f9fa;
@@ -72,342 +76,615 @@ st.markdown("""
         padding: 10px;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
 
-# Google Sheets APIへの接続
-@st.cache_resource
-def get_google_sheets_service():
-    """Google Sheets APIサービスを取得する関数"""
+def set_up_page():
+    """ページ設定とカスタムCSSを適用する関数（画面を描画するときだけ呼ぶので、読み込むだけなら何も表示しない）"""
+    st.set_page_config(
+        page_title="インターン情報自動作成ツール",
+        page_icon="🎓",
+        layout="wide"
+    )
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+def show_bulk_import():
+    """CSV/Excelファイルからインターン情報を一括で取り込む画面を表示する関数"""
+    st.markdown("###### ファイルから一括取り込み")
+    st.download_button(
+        "テンプレートCSVをダウンロード",
+        ",".join(intern_info.IMPORT_COLUMNS) + "\n",
+        file_name="intern_template.csv",
+        mime="text/csv"
+    )
+    uploaded_file = st.file_uploader("CSV / Excelファイル", type=["csv", "xlsx"])
+    if not uploaded_file:
+        return
+    
     try:
-        # デバッグ情報を追加
-        print("利用可能なシークレットキー:", list(st.secrets.keys()))
+        df = intern_info.read_postings_file(uploaded_file)
+    except Exception as e:
+        st.error(f"⚠️ ファイルの読み込みに失敗しました: {str(e)}")
+        return
+    
+    infos, error_rows = intern_info.build_postings_from_dataframe(df)
+    st.info(f"{len(infos)}件のインターン情報を生成しました（エラー: {len(error_rows)}件）")
+    if len(error_rows):
+        st.error("⚠️ 以下の行は取り込まれません。")
+        st.dataframe(error_rows, hide_index=True)
+    if not infos:
+        return
+    
+    # ほぼ重複の確認は取り込んだファイルごとに1回だけ行う（画面の再実行のたびに全行を確認しない）
+    checked = st.session_state.get("bulk_duplicates")
+    if checked is None or checked[0] != uploaded_file.file_id:
+        duplicates = [
+            {
+                "インターン名": info["インターン名"],
+                "開始予定日": info["開始予定日"],
+                "ほぼ同じ保存済みのインターン情報": near_duplicates.describe(matches),
+            }
+            for info, matches in zip(infos, check_near_duplicates(infos)) if matches
+        ]
+        st.session_state.bulk_duplicates = (uploaded_file.file_id, duplicates)
+    duplicates = st.session_state.bulk_duplicates[1]
+    if duplicates:
+        st.warning(f"⚠️ {len(duplicates)}件は保存済みのインターン情報とほぼ同じです。重複していないか確認してください。")
+        st.dataframe(duplicates, hide_index=True)
+    
+    with st.expander("生成されたインターン情報（先頭のみ）"):
+        st.code(infos[0]['説明'], language="text")
+    
+    if st.button("Googleスプレッドシートに一括保存する", key="bulk_save_button"):
+        job_id = submit_save_job(infos, uploaded_file.name)
+        st.info(f"保存ジョブ [{job_id}] を登録しました。作業を続けられます。")
+    
+    show_save_jobs()
+
+# 一覧画面で絞り込みに使う列
+BROWSER_FILTER_COLUMNS = ["業界", "職種", "形式"]
+# 一覧画面で表示する列（説明は長いので個別に表示する）
+BROWSER_DISPLAY_COLUMNS = [header for header in sheets_store.SHEET_HEADERS if header != "説明"]
+
+@st.cache_resource
+def get_posting_store(spreadsheet_id, sheet_name):
+    """保存済みインターン情報の一覧と検索用の索引を取得する関数（全セッションで共有）
+    
+    差分取得で行を追記していくため st.cache_data（読み出しごとにコピーされる）ではなく
+    st.cache_resource で保持し、中身は sync_posting_store() で更新する。
+    """
+    return {"lock": threading.Lock(), "snapshot": None, "synced_at": None}
+
+def fetch_sheet_rows(service, spreadsheet_id, sheet_name, start_row):
+    """指定した行以降の全行を取得し、列数をそろえて返す関数"""
+    result = sheets_store.execute_sheets_request(service.spreadsheets().values().get(
+        spreadsheetId=spreadsheet_id,
+        range=sheets_store.a1_range(sheet_name, f"A{start_row}:{sheets_store.SHEET_LAST_COLUMN}")
+    ), "values.get")
+    # 末尾の空欄は返ってこないので列数をそろえる
+    return [row + [""] * (len(sheets_store.SHEET_HEADERS) - len(row)) for row in result.get('values', [])]
+
+def build_posting_indexes(df):
+    """絞り込み用の索引を作成する関数
+    
+    列ごとに「値 → 行位置の配列」を、応募締切は日付順に並べた行位置の配列を持つ。
+    """
+    import numpy as np
+    import pandas as pd
+    
+    columns = {column: df.groupby(column, sort=False).indices for column in BROWSER_FILTER_COLUMNS}
+    deadlines = pd.to_datetime(df["応募締切"], errors="coerce").to_numpy()
+    dated = np.flatnonzero(~pd.isna(deadlines))
+    order = dated[np.argsort(deadlines[dated], kind="stable")]
+    return {"columns": columns, "deadline_values": deadlines[order], "deadline_positions": order}
+
+def sync_posting_store(store, spreadsheet_id, sheet_name, full=False):
+    """スプレッドシートの内容を一覧に反映する関数
+    
+    通常は前回取得した行数より後ろの行だけを取得する。
+    既存の行が書き換えられた場合に備えて full=True で全件を取得し直せる。
+    戻り値は新しく取得した行数。
+    """
+    import pandas as pd
+    
+    with store["lock"]:
+        snapshot = store["snapshot"]
+        incremental = not full and snapshot is not None
+        # 1行目はヘッダー行
+        start_row = len(snapshot["df"]) + 2 if incremental else 2
+        with sheets_store.sheets_service() as service:
+            rows = fetch_sheet_rows(service, spreadsheet_id, sheet_name, start_row)
         
-        # サービスアカウント情報の取得方法を修正
-        credentials = service_account.Credentials.from_service_account_info(
-            st.secrets["gcp_service_account"],
-            scopes=["https://www.googleapis.com/auth/spreadsheets"]
+        if incremental and not rows:
+            store["synced_at"] = datetime.now()
+            return 0
+        new_df = pd.DataFrame(rows, columns=sheets_store.SHEET_HEADERS)
+        df = pd.concat([snapshot["df"], new_df], ignore_index=True) if incremental else new_df
+        # 一覧と索引は必ず同時に差し替える（読み出し側がロックなしで参照できるように）
+        store["snapshot"] = {"df": df, "indexes": build_posting_indexes(df)}
+        store["synced_at"] = datetime.now()
+        return len(rows)
+
+def filter_postings(snapshot, filters, deadline_range=None):
+    """索引を使って一覧を絞り込む関数
+    
+    filters は {列名: 値のリスト}（空のリストは絞り込まない）、
+    deadline_range は応募締切の (開始日, 終了日)。
+    """
+    import numpy as np
+    
+    indexes = snapshot["indexes"]
+    positions = None
+    for column, values in filters.items():
+        if not values:
+            continue
+        index = indexes["columns"][column]
+        matched = [index[value] for value in values if value in index]
+        matched = np.concatenate(matched) if matched else np.array([], dtype=np.intp)
+        positions = matched if positions is None else np.intersect1d(positions, matched, assume_unique=True)
+    
+    if deadline_range:
+        start, end = (np.datetime64(day, "ns") for day in deadline_range)
+        low = np.searchsorted(indexes["deadline_values"], start, side="left")
+        high = np.searchsorted(indexes["deadline_values"], end, side="right")
+        matched = indexes["deadline_positions"][low:high]
+        positions = matched if positions is None else np.intersect1d(positions, matched, assume_unique=True)
+    
+    if positions is None:
+        return snapshot["df"]
+    return snapshot["df"].iloc[np.sort(positions)]
+
+def show_posting_browser():
+    """保存済みのインターン情報を一覧・絞り込みする画面を表示する関数"""
+    st.markdown("###### 保存済みのインターン情報")
+    try:
+        spreadsheet_id, sheet_name = sheets_store.get_sheet_config()
+        shard_config = sheets_store.get_shard_config()
+    except Exception as e:
+        st.error(f"⚠️ スプレッドシートの設定を読み込めませんでした: {str(e)}")
+        return
+    
+    # 分割している場合は1つのシートずつ読み込む（各シートが小さいまま保たれる）
+    if shard_config[0]:
+        try:
+            with sheets_store.sheets_service() as service:
+                targets = sheets_store.list_shard_sheets(service, spreadsheet_id, sheet_name, shard_config)
+        except Exception as e:
+            st.error(f"⚠️ シートの一覧を取得できませんでした: {str(e)}")
+            return
+        if not targets:
+            st.info("保存済みのインターン情報はまだありません")
+            return
+        spreadsheet_id, sheet_name = st.selectbox(
+            "シート",
+            targets,
+            format_func=lambda target: target[1],
+            key="browser_shard"
         )
-        
-        return build('sheets', 'v4', credentials=credentials)
+    store = get_posting_store(spreadsheet_id, sheet_name)
+    
+    col_sync, col_reload = st.columns(2)
+    with col_sync:
+        sync = st.button("最新の情報を取得", key="browser_sync_button")
+    with col_reload:
+        reload = st.button("全件を読み込み直す", key="browser_reload_button")
+    
+    try:
+        if store["snapshot"] is None or sync or reload:
+            with st.spinner("スプレッドシートを読み込み中..."):
+                added = sync_posting_store(store, spreadsheet_id, sheet_name, full=reload)
+            if sync:
+                st.info(f"{added}件の新しいインターン情報を取得しました")
     except Exception as e:
-        st.error(f"認証エラー: {str(e)}")
-        st.write(f"エラーの詳細: {type(e).__name__}, {str(e)}")
-        return None
+        st.error(f"⚠️ スプレッドシートの読み込みに失敗しました: {str(e)}")
+        if store["snapshot"] is None:
+            return
+    
+    snapshot = store["snapshot"]
+    st.caption(f"{len(snapshot['df'])}件（最終取得: {store['synced_at'].strftime('%H:%M:%S')}）")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        industries = st.multiselect("業界", intern_info.INDUSTRIES, key="browser_industries")
+    with col2:
+        positions = st.multiselect("職種", intern_info.POSITIONS, key="browser_positions")
+    with col3:
+        work_types = st.multiselect("形式", intern_info.WORK_TYPES, key="browser_work_types")
+    deadline_range = None
+    if st.checkbox("応募締切で絞り込む", key="browser_use_deadline"):
+        selected = st.date_input("応募締切の範囲", value=(), key="browser_deadline_range")
+        if len(selected) == 2:
+            deadline_range = selected
+    
+    filtered = filter_postings(
+        snapshot,
+        {"業界": industries, "職種": positions, "形式": work_types},
+        deadline_range
+    )
+    st.write(f"該当: {len(filtered)}件")
+    st.dataframe(filtered[BROWSER_DISPLAY_COLUMNS], hide_index=True)
+    
+    if len(filtered):
+        # 説明は選んだ1件だけ表示する
+        selected_position = st.selectbox(
+            "説明を表示するインターン",
+            range(min(len(filtered), 1000)),
+            format_func=lambda i: f"{filtered.iloc[i]['インターン名']}（応募締切: {filtered.iloc[i]['応募締切']}）",
+            key="browser_selected"
+        )
+        st.code(filtered.iloc[selected_position]["説明"], language="text")
+
+# エクスポートでスプレッドシートから1回に読み込む行数
+EXPORT_PAGE_ROWS = 1000
 
-def save_to_sheets(info):
-    """Googleスプレッドシートに情報を保存する関数"""
+def write_export(path, export_format, template_name=None, progress=None):
+    """全インターン情報のエクスポートをファイルに少しずつ書き込み、書き出した件数を返す関数
+    
+    progress を指定すると、EXPORT_PAGE_ROWS 件ごとにそれまでの件数を渡して呼び出す。
+    """
+    count = 0
+    
+    def counted():
+        nonlocal count
+        for info in sheets_store.iter_sheet_postings(template_name, EXPORT_PAGE_ROWS):
+            count += 1
+            if progress and count % EXPORT_PAGE_ROWS == 0:
+                progress(count)
+            yield info
+    
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
     try:
-        # TOMLファイルの階層構造の問題を回避する代替コード
+        with open(tmp_path, "wb") as f:
+            for chunk in export.iter_export(counted(), export_format):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    except BaseException:
+        # 途中まで書き込んだファイルを残さない
         try:
-            # 直接スプレッドシートIDを取得してみる
-            spreadsheet_id = st.secrets.get("SPREADSHEET_ID", None)
-            # gcp_service_accountの中から探す
-            if "gcp_service_account" in st.secrets and "SPREADSHEET_ID" in st.secrets["gcp_service_account"]:
-                spreadsheet_id = st.secrets["gcp_service_account"]["SPREADSHEET_ID"]
-            else:
-                # ハードコードバックアップ (テスト用)
-                spreadsheet_id = "1SsUwD9XsadcfaxsefaMu49lx72iQxaefdaefA7KzvM"
-            
-            # シート名も同様に
-            sheet_name = st.secrets.get("SHEET_NAME", None)
-            if not sheet_name:
-                if "gcp_service_account" in st.secrets and "SHEET_NAME" in st.secrets["gcp_service_account"]:
-                    sheet_name = st.secrets["gcp_service_account"]["SHEET_NAME"]
-                else:
-                    sheet_name = "info"
-                    
-            service = get_google_sheets_service()
-            if not service:
-                return False, "Google認証に失敗しました"
-            
-            # ヘッダー行を準備
-            headers = [
-                "インターン名", "企業名", "業界", "形式", "勤務地", "最寄り駅",
-                "期間", "職種", "募集対象", "報酬", "交通費", "勤務可能時間",
-                "勤務日数", "勤務時間", "選考フロー", "応募締切", "開始予定日",
-                "募集人数", "必須スキル", "歓迎スキル", "説明"
-            ]
-            
-            # データ行を準備
-            values = [
-                info["インターン名"], info["企業名"], info["業界"], info["形式"],
-                info["勤務地"], info["最寄り駅"], info["期間"], info["職種"],
-                info["募集対象"], info["報酬"], info["交通費"], info["勤務可能時間"],
-                info["勤務日数"], info["勤務時間"], info["選考フロー"],
-                info["応募締切"], info["開始予定日"], info["募集人数"],
-                info["必須スキル"], info["歓迎スキル"], info["説明"]
-            ]
-            
-            # シートが存在するか確認
-            try:
-                # シート情報を取得
-                sheet_metadata = service.spreadsheets().get(spreadsheetId=spreadsheet_id).execute()
-                sheets = sheet_metadata.get('sheets', '')
-                
-                # シート名リストを取得
-                sheet_names = [sheet['properties']['title'] for sheet in sheets]
-                
-                # シートが存在しない場合は作成
-                if sheet_name not in sheet_names:
-                    service.spreadsheets().batchUpdate(
-                        spreadsheetId=spreadsheet_id,
-                        body={
-                            'requests': [{
-                                'addSheet': {
-                                    'properties': {
-                                        'title': sheet_name
-                                    }
-                                }
-                            }]
-                        }
-                    ).execute()
-                    
-                    # ヘッダー行を書き込む
-                    service.spreadsheets().values().update(
-                        spreadsheetId=spreadsheet_id,
-                        range=f"{sheet_name}!A1:U1",
-                        valueInputOption='RAW',
-                        body={'values': [headers]}
-                    ).execute()
-            except Exception as e:
-                st.error(f"シート確認中にエラーが発生しました: {str(e)}")
-                return False, f"シート確認中にエラーが発生しました: {str(e)}"
-            
-            # 既存のデータを取得
-            result = service.spreadsheets().values().get(
-                spreadsheetId=spreadsheet_id,
-                range=f"{sheet_name}!A:U"
-            ).execute()
-            
-            # 行番号を計算（ヘッダー行を除く）
-            rows = result.get('values', [])
-            next_row = len(rows) + 1
-            
-            # 新しいデータを追加
-            service.spreadsheets().values().update(
-                spreadsheetId=spreadsheet_id,
-                range=f"{sheet_name}!A{next_row}:U{next_row}",
-                valueInputOption='RAW',
-                body={'values': [values]}
-            ).execute()
-            
-            return True, "スプレッドシートに保存しました"
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    return count
+
+def read_export_file(path):
+    """エクスポートしたファイルの内容を返す関数（ダウンロードボタンが押されたときだけ呼び出す）"""
+    with open(path, "rb") as f:
+        return f.read()
+
+def show_export(template_name):
+    """保存済みの全インターン情報を一括でエクスポートする画面を表示する関数"""
+    st.markdown("###### 一括エクスポート")
+    st.caption(
+        "保存済みの全インターン情報を、説明をテンプレートで描画し直して書き出します。"
+        "スプレッドシートは少しずつ読み込むので、件数が多くてもメモリを使いすぎません。"
+    )
+    export_format = st.radio(
+        "形式",
+        list(export.EXPORT_FORMATS),
+        format_func=lambda name: export.EXPORT_FORMATS[name][0],
+        horizontal=True,
+        key="export_format"
+    )
+    if st.button("エクスポートを作成", key="export_button"):
+        extension = export.EXPORT_FORMATS[export_format][1]
+        path = os.path.join(sinks.LOCAL_SINK_DIR, f"postings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+        status = st.empty()
+        try:
+            with st.spinner("エクスポート中..."):
+                count = write_export(
+                    path, export_format, template_name,
+                    progress=lambda done: status.info(f"{done}件を書き出しました...")
+                )
         except Exception as e:
-            st.error(f"エラーの詳細: {str(e)}")
-            return False, f"スプレッドシートへの保存に失敗しました: {str(e)}"
-    except Exception as e:
-        st.error(f"予期せぬエラーが発生しました: {str(e)}")
-        return False, f"予期せぬエラーが発生しました: {str(e)}"
-
-# 選択肢の定義
-INDUSTRIES = [
-    "IT・テクノロジー",
-    "金融・保険",
-    "製造・メーカー",
-    "商社・流通",
-    "サービス",
-    "広告・マーケティング",
-    "コンサルティング",
-    "メディア・エンターテインメント",
-    "小売・流通",
-    "不動産・建設",
-    "医療・ヘルスケア",
-    "教育",
-    "エネルギー・資源",
-    "運輸・物流",
-    "その他"
-]
-
-WORK_TYPES = [
-    "対面",
-    "オンライン",
-    "ハイブリッド"
-]
-
-# 24時間（30分単位）の時間リストを生成
-def generate_time_list():
-    times = []
-    for hour in range(24):
-        for minute in [0, 30]:
-            time_str = f"{hour:02d}:{minute:02d}"
-            times.append(time_str)
-    times.append("フレックス制")
-    return times
-
-TIMES = generate_time_list()
-
-WORKING_DAYS = [
-    "週1日",
-    "週2日",
-    "週3日",
-    "週4日",
-    "週5日",
-    "週1日〜",
-    "週2日〜",
-    "週3日〜",
-    "週4日〜",
-    "週5日〜",
-    "その他"
-]
-
-TRANSPORTATION_FEES = [
-    "支給なし",
-    "一部支給",
-    "全額支給",
-    "その他"
-]
-
-PERIODS = [
-    "1日",
-    "2日",
-    "3日",
-    "1週間",
-    "2週間",
-    "3週間",
-    "1ヶ月",
-    "2ヶ月",
-    "3ヶ月",
-    "夏季（7-8月）",
-    "冬季（12-1月）",
-    "春季（3-4月）",
-    "通年",
-    "その他"
-]
-
-POSITIONS = [
-    "エンジニア",
-    "デザイナー",
-    "マーケティング",
-    "営業",
-    "企画",
-    "人事",
-    "経理・財務",
-    "法務",
-    "その他"
-]
-
-GRADES = [
-    "大学1年生",
-    "大学2年生",
-    "大学3年生",
-    "大学4年生",
-    "大学院1年生",
-    "大学院2年生",
-    "その他"
-]
-
-SALARIES = [
-    "無給",
-    "時給1,000円",
-    "時給1,500円",
-    "時給2,000円",
-    "日給10,000円",
-    "日給15,000円",
-    "その他"
-]
-
-SELECTION_PROCESS = [
-    "書類選考 → 面接",
-    "書類選考 → グループディスカッション → 面接",
-    "書類選考 → 筆記試験 → 面接",
-    "書類選考 → グループワーク → 面接",
-    "その他"
-]
-
-def generate_intern_info(company, industry, work_type, location, nearest_station, period, position, grade, salary, 
-                        transportation_fee, start_time, end_time, working_days, working_time_per_week, skills, required_skills,
-                        selection_process, deadline, start_date, capacity):
-    intern_name = f"{company} {position}インターンシップ"
-    working_hours = f"{start_time}〜{end_time}" if start_time != "フレックス制" and end_time != "フレックス制" else "フレックス制"
-    description = f"""
-【募集要項】
-###### 募集職種
-{position}
-
-###### 雇用形態
-アルバイト
-
-###### 給与
-{salary}
-
-###### 交通費
-{transportation_fee}
-
-###### 勤務地
-{location}
-
-###### 最寄り駅
-{nearest_station}
-
-###### 勤務可能時間
-{working_hours}
-
-###### 勤務日数
-{working_days}
-
-###### 勤務時間
-{working_time_per_week}
-
-###### 勤務期間
-{period}
-
-###### 業界
-{industry}
-
-###### 業種
-{position}
-
-###### 形式
-{work_type}
-
-###### 勤務時間
-・期間：{start_date}〜{period}以上勤務できる方
-・稼働時間：{working_time_per_week}以上勤務できる方
-・勤務時間：{working_hours}内（土日祝日を除く）
-
-###### 応募条件
-・{grade}大歓迎！
-
-###### 必須スキル
-{required_skills}
-
-###### 歓迎スキル
-{skills}
-
-###### 選考フロー
-{selection_process}
-
-###### 応募締切
-{deadline}
-
-###### 募集人数
-{capacity}名
-"""
-    return {
-        "インターン名": intern_name,
-        "説明": description,
-        "期間": period,
-        "企業名": company,
-        "業界": industry,
-        "形式": work_type,
-        "勤務地": location,
-        "最寄り駅": nearest_station,
-        "職種": position,
-        "募集対象": grade,
-        "報酬": salary,
-        "交通費": transportation_fee,
-        "勤務可能時間": working_hours,
-        "勤務日数": working_days,
-        "勤務時間": working_time_per_week,
-        "選考フロー": selection_process,
-        "応募締切": deadline,
-        "開始予定日": start_date,
-        "募集人数": capacity,
-        "必須スキル": required_skills,
-        "歓迎スキル": skills
+            status.empty()
+            st.error(f"⚠️ エクスポートに失敗しました: {str(e)}")
+            return
+        status.success(f"✅ {count}件を書き出しました（サーバー上の保存先: {path}）")
+        st.session_state.export_file = (path, export_format)
+    
+    export_file = st.session_state.get("export_file")
+    if export_file and os.path.exists(export_file[0]):
+        path, file_format = export_file
+        # ファイルを渡すと再実行のたびに全体をメモリに読み込むので、押されたときに読み込む関数を渡す
+        st.download_button(
+            f"{os.path.basename(path)} をダウンロード",
+            lambda: read_export_file(path),
+            file_name=os.path.basename(path),
+            mime=export.EXPORT_FORMATS[file_format][2],
+            key="export_download"
+        )
+
+# バックグラウンド保存ジョブの同時実行数
+SAVE_JOB_WORKERS = 4
+
+JOB_QUEUED = "待機中"
+JOB_RUNNING = "実行中"
+JOB_DONE = "完了"
+JOB_FAILED = "失敗"
+JOB_HANDED_OVER = "自動送信中"
+
+@st.cache_resource
+def get_save_executor():
+    """保存ジョブを実行するスレッドプールを取得する関数（全セッションで共有）"""
+    return ThreadPoolExecutor(max_workers=SAVE_JOB_WORKERS, thread_name_prefix="save-job")
+
+@st.cache_resource
+def start_sheets_warm_up():
+    """Sheets APIの事前準備をプロセスごとに1回だけバックグラウンドで始める関数（SHEETS_WARM_UP=0 で行わない）
+    
+    サーバー起動後に最初の画面を開いた時点で始まるので、最初の保存ボタンを押すまでには終わっている。
+    """
+    if not sheets_store.SHEETS_WARM_UP:
+        return None
+    
+    def run():
+        success, message = sheets_store.warm_up()
+        if not success:
+            print(message)
+    
+    thread = threading.Thread(target=run, name="sheets-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+def show_failed_outbox_entries():
+    """送信箱の送信できなかった（再試行をやめた）インターン情報を表示し、送信し直すか破棄できるようにする関数"""
+    for sink in sinks.get_enabled_sinks():
+        count = outbox.failed_count(sink.name)
+        if not count:
+            continue
+        st.error(f"❌ {sink.label}に送信できなかったもの: {count}件（{outbox.OUTBOX_MAX_ATTEMPTS}回失敗したため再試行をやめました）")
+        with st.expander(f"{sink.label}に送信できなかったもの"):
+            st.dataframe([
+                {"インターン名": info["インターン名"], "開始予定日": info["開始予定日"], "失敗した回数": attempts, "エラー": error}
+                for _, info, attempts, error in outbox.failed_entries(sink.name)
+            ], hide_index=True)
+            col_requeue, col_discard = st.columns(2)
+            with col_requeue:
+                if st.button("送信し直す", key=f"requeue_failed_{sink.name}"):
+                    st.success(f"{outbox.requeue_failed(sink.name)}件を送信待ちに戻しました")
+            with col_discard:
+                if st.button("破棄する", key=f"discard_failed_{sink.name}"):
+                    st.success(f"{outbox.discard_failed(sink.name)}件を破棄しました")
+
+def submit_save_job(infos, label):
+    """インターン情報を有効な保存先ごとの送信箱に書き込み、保存ジョブをバックグラウンドに登録してジョブIDを返す関数
+    
+    送信箱への書き込みが終わった時点でページを再読み込みしても失われない。
+    保存ジョブはすべての保存先に同時に保存する。
+    """
+    if 'save_jobs' not in st.session_state:
+        st.session_state.save_jobs = {}
+    enabled = sinks.get_enabled_sinks()
+    ids_by_sink = {sink.name: outbox.enqueue(infos, sink.name) for sink in enabled}
+    job_id = uuid.uuid4().hex[:8]
+    st.session_state.save_jobs[job_id] = {
+        "label": label,
+        "count": len(infos),
+        "sinks": {sink.name: sink.label for sink in enabled},
+        "submitted_at": datetime.now().strftime("%H:%M:%S"),
+        "future": get_save_executor().submit(outbox_flusher.flush_outbox_entries, ids_by_sink),
     }
+    return job_id
+
+def get_job_status(job):
+    """保存ジョブの状態と結果メッセージを返す関数"""
+    future = job["future"]
+    if not future.done():
+        return (JOB_RUNNING if future.running() else JOB_QUEUED), ""
+    if future.exception() is not None:
+        return JOB_FAILED, f"予期せぬエラーが発生しました: {str(future.exception())}"
+    results_by_sink = future.result()
+    messages = []
+    failed = False
+    handed_over = False
+    for name, results in results_by_sink.items():
+        label = job["sinks"].get(name, name)
+        failures = [message for success, message in results if success is False]
+        pending = sum(1 for success, _ in results if success is None)
+        if pending:
+            handed_over = True
+            messages.append(f"{label}: {pending}件は自動送信で保存中です（送信待ちはサイドバーで確認できます）")
+            results = [result for result in results if result[0] is not None]
+            if not results:
+                continue
+        if failures:
+            failed = True
+            messages.append(
+                f"{label}: {len(failures)}件の保存に失敗しました（成功: {len(results) - len(failures)}件）: {failures[0]}"
+            )
+        elif len(results) == 1:
+            messages.append(f"{label}: {results[0][1]}")
+        else:
+            messages.append(f"{label}: {len(results)}件を保存しました")
+    if failed:
+        return JOB_FAILED, " / ".join(messages) + " / 送信箱に残っているため自動で再試行します"
+    if handed_over:
+        return JOB_HANDED_OVER, " / ".join(messages)
+    return JOB_DONE, " / ".join(messages)
+
+def show_save_jobs():
+    """このセッションで登録した保存ジョブの状態を表示する関数"""
+    jobs = st.session_state.get('save_jobs', {})
+    if not jobs:
+        return
+    st.markdown("###### 保存ジョブ")
+    icons = {JOB_QUEUED: "⏳", JOB_RUNNING: "🔄", JOB_DONE: "✅", JOB_FAILED: "⚠️", JOB_HANDED_OVER: "📮"}
+    pending = False
+    for job_id, job in reversed(list(jobs.items())):
+        status, message = get_job_status(job)
+        pending = pending or status in (JOB_QUEUED, JOB_RUNNING)
+        text = f"{icons[status]} [{job_id}] {job['submitted_at']} {job['label']}（{job['count']}件）: {status}"
+        if message:
+            text += f" - {message}"
+        if status == JOB_FAILED:
+            st.error(text)
+        elif status == JOB_DONE:
+            st.success(text)
+        else:
+            st.info(text)
+    col_refresh, col_clear = st.columns(2)
+    with col_refresh:
+        if pending:
+            st.button("状態を更新", key="refresh_jobs_button")
+    with col_clear:
+        if st.button("完了したジョブを消去", key="clear_jobs_button"):
+            st.session_state.save_jobs = {
+                job_id: job for job_id, job in jobs.items() if not job["future"].done()
+            }
+            st.rerun()
+
+def check_near_duplicates(infos):
+    """保存済みのインターン情報から、infos のそれぞれとほぼ同じものを探す関数（索引が読めない場合は空のリスト）"""
+    try:
+        return near_duplicates.find_near_duplicates_many(infos)
+    except Exception as e:
+        print(f"ほぼ重複の確認中にエラーが発生しました: {str(e)}")
+        return [[] for _ in infos]
+
+def generate_from_inputs(company, industry, work_type, location, nearest_station, period, position, grade, salary,
+                         transportation_fee, start_time, end_time, working_days, working_time_per_week, skills, required_skills,
+                         selection_process, deadline, start_date, capacity, template_name):
+    """入力値からインターン情報を生成してセッション状態に保存する関数"""
+    if company and location and required_skills:
+        # 募集対象を文字列に変換
+        grade_text = "、".join(grade)
+        
+        info = intern_info.generate_intern_info(
+            company, industry, work_type, location, nearest_station, period, position, grade_text,
+            f"時給{salary}円", transportation_fee, start_time, end_time, working_days, f"週{working_time_per_week}時間",
+            skills, required_skills, selection_process, deadline.strftime("%Y-%m-%d"),
+            start_date.strftime("%Y-%m-%d"), str(capacity), template_name
+        )
+        
+        # セッション状態に情報を保存
+        st.session_state.info = info
+        st.session_state.info_generated = True
+        st.session_state.info_template = intern_info.resolve_template_name(company, template_name)
+        # プレビューの選択欄は前回の選択を保持するので、生成に使ったテンプレートに戻す
+        st.session_state.preview_template = st.session_state.info_template
+        st.session_state.info_duplicates = check_near_duplicates([info])[0]
+        
+        st.success("🎉 インターン情報が生成されました！")
+    else:
+        st.error("⚠️ 必須項目（企業名、勤務地、必須スキル）を入力してください。")
+
+def show_form_input(template_name):
+    """全項目を1つのフォームにまとめた入力画面を表示する関数
+    
+    入力中は再実行されず、「インターン情報を生成」を押したときだけ1回実行される。
+    フォーム内では選択に応じて入力欄を出し分けられないため、「その他」の入力欄は常に表示する。
+    """
+    with st.form("intern_form"):
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("###### 基本情報")
+            company = st.text_input("企業名", placeholder="例: 株式会社〇〇")
+            industry = st.selectbox("業界", intern_info.INDUSTRIES)
+            work_type = st.selectbox("形式", intern_info.WORK_TYPES)
+            location = st.text_input("勤務地", placeholder="例: 東京都渋谷区道玄坂1-2-3 渋谷フクラス")
+            nearest_station = st.text_input("最寄り駅", placeholder="例: JR山手線・埼京線、東急東横線・田園都市線、京王井の頭線、地下鉄銀座線・半蔵門線の渋谷駅より徒歩1分")
+            period = st.selectbox("インターン期間", intern_info.PERIODS)
+            position = st.selectbox("インターン職種", intern_info.POSITIONS)
+            grade = st.multiselect("募集対象", intern_info.GRADES)
+            other_grade = st.text_input("募集対象（「その他」を選んだ場合）", placeholder="例: 社会人")
+            salary = st.number_input("報酬（時給）", min_value=0, step=100, value=1000)
+            transportation_fee = st.selectbox("交通費", intern_info.TRANSPORTATION_FEES)
+            other_transportation_fee = st.text_input("交通費（「その他」を選んだ場合）", placeholder="例: 上限5,000円まで支給")
+        
+        with col2:
+            st.markdown("###### 詳細情報")
+            col_start, col_end = st.columns(2)
+            with col_start:
+                start_time = st.selectbox("開始時間", intern_info.TIMES)
+            with col_end:
+                end_time = st.selectbox("終了時間", intern_info.TIMES)
+            working_days = st.selectbox("勤務日数", intern_info.WORKING_DAYS)
+            other_working_days = st.text_input("勤務日数（「その他」を選んだ場合）", placeholder="例: 月2回〜")
+            working_time_per_week = st.number_input("勤務時間（週）", min_value=0, step=1, value=15)
+            selection_process = st.selectbox("選考フロー", intern_info.SELECTION_PROCESS)
+            deadline = st.date_input("応募締切日")
+            start_date = st.date_input("インターン開始予定日")
+            capacity = st.number_input("募集人数", min_value=1, step=1)
+            required_skills = st.text_area("必須スキル", placeholder="例:\n・Webアプリケーションの開発経験\n・コミュニケーション能力", height=100)
+            skills = st.text_area("歓迎スキル", placeholder="例:\n・Ruby on Railsを用いたWebアプリケーションの開発経験\n・WordPressのカスタマイズ経験\n・MySQLなどのRDBMSを用いたWebアプリケーション開発\n・GitHubを用いたチーム開発の経験", height=100)
+        
+        submitted = st.form_submit_button("インターン情報を生成", type="primary")
+    
+    if submitted:
+        # 「その他」を選んだ項目は入力欄の値を使う
+        if "その他" in grade:
+            grade = [g for g in grade if g != "その他"] + [other_grade]
+        if transportation_fee == "その他":
+            transportation_fee = other_transportation_fee
+        if working_days == "その他":
+            working_days = other_working_days
+        generate_from_inputs(
+            company, industry, work_type, location, nearest_station, period, position, grade, salary,
+            transportation_fee, start_time, end_time, working_days, working_time_per_week, skills, required_skills,
+            selection_process, deadline, start_date, capacity, template_name
+        )
+    
+    show_generated_panels()
+
+@st.fragment
+def show_save_panel():
+    """保存パネルを表示する関数（操作してもこのパネルだけが再実行される）"""
+    # 保存先（スプレッドシート・Notion・ローカルファイル）への保存オプション
+    st.markdown("###### 保存")
+    st.caption("保存先: " + "、".join(sink.label for sink in sinks.get_enabled_sinks()))
+    if st.session_state.get("info_duplicates"):
+        st.warning(
+            "⚠️ ほぼ同じインターン情報が保存済みです: "
+            + near_duplicates.describe(st.session_state.info_duplicates)
+        )
+    
+    # ラジオボタンの選択状態をセッションに保存
+    st.session_state.save_option = st.radio(
+        "保存オプション",
+        ["保存しない", "保存する"],
+        key="save_option_radio"
+    )
+    
+    # 保存オプションが選択された場合、保存ボタンを表示
+    if st.session_state.save_option == "保存する":
+        save_button = st.button("保存を実行する", key="save_button")
+        if save_button:
+            job_id = submit_save_job([st.session_state.info], st.session_state.info['インターン名'])
+            st.info(f"保存ジョブ [{job_id}] を登録しました。作業を続けられます。")
+    
+    show_save_jobs()
+
+@st.fragment
+def show_preview_panel():
+    """生成結果のプレビューを表示する関数（テンプレートの切り替えはこのパネルだけで再実行される）"""
+    st.markdown("###### 生成されたインターン情報")
+    template_names = list(intern_info.DESCRIPTION_TEMPLATES)
+    current = st.session_state.get('info_template', intern_info.DEFAULT_TEMPLATE_NAME)
+    selected = st.selectbox(
+        "プレビューのテンプレート",
+        template_names,
+        index=template_names.index(current) if current in template_names else 0,
+        key="preview_template"
+    )
+    if selected != current:
+        # 保存される説明もプレビューと同じものにする
+        st.session_state.info = st.session_state.info._replace(
+            説明=intern_info.get_template_renderers()[selected](st.session_state.info)
+        )
+        st.session_state.info_template = selected
+    st.code(st.session_state.info['説明'], language="text")
+
+def show_generated_panels():
+    """生成された情報がある場合に、保存パネルとプレビューを表示する関数"""
+    if st.session_state.info_generated and st.session_state.info:
+        show_save_panel()
+        show_preview_panel()
 
 def main():
+    set_up_page()
+    
     # セッション状態の初期化
     if 'info' not in st.session_state:
         st.session_state.info = None
@@ -416,6 +693,14 @@ def main():
     if 'save_option' not in st.session_state:
         st.session_state.save_option = "保存しない"
     
+    # 送信箱の自動送信を開始（プロセスごとに1回だけ）
+    start_sheets_warm_up()
+    outbox_flusher.start_outbox_flusher()
+    
+    # APIの計測結果の公開（METRICS_PORT が設定されている場合のみ）と管理者メニュー
+    metrics.start_server_from_env()
+    metrics.show_admin_panel()
+    
     # ヘッダー
     st.markdown("""
     <div style='text-align: center; margin-bottom: 30px;'>
@@ -439,7 +724,61 @@ def main():
         2. 「インターン情報を生成」ボタンをクリック
         3. 生成された情報を確認
         4. Googleスプレッドシートに保存（オプション）
+        
+        CSV / Excelファイルから複数件をまとめて取り込むこともできます。
         """)
+        
+        input_mode = st.radio(
+            "入力方法",
+            ["まとめて入力", "項目ごとに入力", "ファイル一括取り込み", "保存済み一覧", "一括エクスポート"],
+            key="input_mode",
+            help="「まとめて入力」は生成ボタンを押すまで画面が再実行されないため、動作が軽くなります。"
+        )
+        
+        # 説明文テンプレート
+        template_names = list(intern_info.DESCRIPTION_TEMPLATES)
+        template_name = st.selectbox(
+            "説明テンプレート",
+            ["企業ごとの設定に従う"] + template_names,
+            key="template_name"
+        )
+        if template_name not in template_names:
+            template_name = None
+        with st.expander("スプレッドシートの説明を再生成"):
+            st.caption("テンプレートを変更した場合に、保存済みの全インターン情報の説明を作り直します。")
+            if st.button("全件の説明を再生成する", key="regenerate_button"):
+                with st.spinner("説明を再生成中..."):
+                    success, result = sheets_store.regenerate_sheet_descriptions(template_name)
+                if success:
+                    st.success(f"✅ {result}")
+                else:
+                    st.error(f"⚠️ {result}")
+        
+        # 送信箱（保存先に未送信のインターン情報）
+        pending = {sink: outbox.pending_count(sink.name) for sink in sinks.get_enabled_sinks()}
+        if any(pending.values()):
+            st.warning("📮 送信待ち: " + "、".join(
+                f"{sink.label} {count}件" for sink, count in pending.items() if count
+            ) + "（自動で再試行します）")
+            if st.button("今すぐ送信する", key="flush_outbox_button"):
+                # 再試行待ちのものも含めて今すぐ送信する
+                get_save_executor().submit(outbox_flusher.flush_outbox_entries, {
+                    sink.name: outbox.pending_ids(sink.name) for sink, count in pending.items() if count
+                })
+        show_failed_outbox_entries()
+    
+    if input_mode == "ファイル一括取り込み":
+        show_bulk_import()
+        return
+    if input_mode == "保存済み一覧":
+        show_posting_browser()
+        return
+    if input_mode == "一括エクスポート":
+        show_export(template_name)
+        return
+    if input_mode == "まとめて入力":
+        show_form_input(template_name)
+        return
 
     # メインコンテンツ
     col1, col2 = st.columns(2)
@@ -447,18 +786,18 @@ def main():
     with col1:
         st.markdown("###### 基本情報")
         company = st.text_input("企業名", placeholder="例: 株式会社〇〇")
-        industry = st.selectbox("業界", INDUSTRIES)
-        work_type = st.selectbox("形式", WORK_TYPES)
+        industry = st.selectbox("業界", intern_info.INDUSTRIES)
+        work_type = st.selectbox("形式", intern_info.WORK_TYPES)
         location = st.text_input("勤務地", placeholder="例: 東京都渋谷区道玄坂1-2-3 渋谷フクラス")
         nearest_station = st.text_input("最寄り駅", placeholder="例: JR山手線・埼京線、東急東横線・田園都市線、京王井の頭線、地下鉄銀座線・半蔵門線の渋谷駅より徒歩1分")
-        period = st.selectbox("インターン期間", PERIODS)
-        position = st.selectbox("インターン職種", POSITIONS)
-        grade = st.multiselect("募集対象", GRADES)
+        period = st.selectbox("インターン期間", intern_info.PERIODS)
+        position = st.selectbox("インターン職種", intern_info.POSITIONS)
+        grade = st.multiselect("募集対象", intern_info.GRADES)
         if "その他" in grade:
             other_grade = st.text_input("募集対象（その他）", placeholder="例: 社会人")
             grade = [g for g in grade if g != "その他"] + [other_grade]
         salary = st.number_input("報酬（時給）", min_value=0, step=100, value=1000)
-        transportation_fee = st.selectbox("交通費", TRANSPORTATION_FEES)
+        transportation_fee = st.selectbox("交通費", intern_info.TRANSPORTATION_FEES)
         if transportation_fee == "その他":
             transportation_fee = st.text_input("交通費（その他）", placeholder="例: 上限5,000円まで支給")
     
@@ -466,14 +805,14 @@ def main():
         st.markdown("###### 詳細情報")
         col_start, col_end = st.columns(2)
         with col_start:
-            start_time = st.selectbox("開始時間", TIMES)
+            start_time = st.selectbox("開始時間", intern_info.TIMES)
         with col_end:
-            end_time = st.selectbox("終了時間", TIMES)
-        working_days = st.selectbox("勤務日数", WORKING_DAYS)
+            end_time = st.selectbox("終了時間", intern_info.TIMES)
+        working_days = st.selectbox("勤務日数", intern_info.WORKING_DAYS)
         if working_days == "その他":
             working_days = st.text_input("勤務日数（その他）", placeholder="例: 月2回〜")
         working_time_per_week = st.number_input("勤務時間（週）", min_value=0, step=1, value=15)
-        selection_process = st.selectbox("選考フロー", SELECTION_PROCESS)
+        selection_process = st.selectbox("選考フロー", intern_info.SELECTION_PROCESS)
         deadline = st.date_input("応募締切日")
         start_date = st.date_input("インターン開始予定日")
         capacity = st.number_input("募集人数", min_value=1, step=1)
@@ -482,55 +821,13 @@ def main():
     
     # 生成ボタン
     if st.button("インターン情報を生成", type="primary"):
-        if company and location and required_skills:
-            # 募集対象を文字列に変換
-            grade_text = "、".join(grade)
-            
-            info = generate_intern_info(
-                company, industry, work_type, location, nearest_station, period, position, grade_text,
-                f"時給{salary}円", transportation_fee, start_time, end_time, working_days, f"週{working_time_per_week}時間",
-                skills, required_skills, selection_process, deadline.strftime("%Y-%m-%d"),
-                start_date.strftime("%Y-%m-%d"), str(capacity)
-            )
-            
-            # セッション状態に情報を保存
-            st.session_state.info = info
-            st.session_state.info_generated = True
-            
-            st.success("🎉 インターン情報が生成されました！")
-        else:
-            st.error("⚠️ 必須項目（企業名、勤務地、必須スキル）を入力してください。")
-    
-    # 生成された情報がある場合に表示
-    if st.session_state.info_generated and st.session_state.info:
-        # Googleスプレッドシートへの保存オプション
-        st.markdown("###### Googleスプレッドシートへの保存")
-        
-        # ラジオボタンの選択状態をセッションに保存
-        st.session_state.save_option = st.radio(
-            "保存オプション",
-            ["保存しない", "Googleスプレッドシートに保存する"],
-            key="save_option_radio"
+        generate_from_inputs(
+            company, industry, work_type, location, nearest_station, period, position, grade, salary,
+            transportation_fee, start_time, end_time, working_days, working_time_per_week, skills, required_skills,
+            selection_process, deadline, start_date, capacity, template_name
         )
-        
-        # 保存オプションが選択された場合、保存ボタンを表示
-        if st.session_state.save_option == "Googleスプレッドシートに保存する":
-            save_button = st.button("保存を実行する", key="save_button")
-            if save_button:
-                with st.spinner("スプレッドシートに保存中..."):
-                    try:
-                        success, result = save_to_sheets(st.session_state.info)
-                        if success:
-                            st.success(f"✅ {result}")
-                        else:
-                            st.error(f"⚠️ {result}")
-                    except Exception as e:
-                        st.error(f"⚠️ エラーが発生しました: {str(e)}")
-                        st.write(f"エラー詳細: {str(e)}")
-
-        # 結果を表示
-        st.markdown("###### 生成されたインターン情報")
-        st.code(st.session_state.info['説明'], language="text")
+    
+    show_generated_panels()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
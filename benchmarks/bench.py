@@ -0,0 +1,608 @@
+"""インターン情報の生成・保存処理のベンチマーク
+
+使い方:
+    python benchmarks/bench.py [generate|sheets|notion ...] [--output 結果ファイル]
+
+- generate: generate_intern_info の処理速度
+- sheets:   save_to_sheets / save_many_to_sheets のAPI呼び出し回数と所要時間
+            （遅延を再現する偽のSheets APIを使い、実際のGoogle APIには接続しない）
+            偽のAPIが429（クォータ超過）を返した場合に再試行で保存できることも確認する
+- notion:   create_notion_page / create_notion_pages の所要時間
+            （ローカルに立てたNotion APIの代わりのサーバーを使う）
+            データベースの定義の取得が1回だけで、定義に合わないものはAPIを呼ばずに失敗することも確認する
+- export:   全件エクスポート（CSV / JSON Lines / Markdownのzip）の所要時間と最大メモリ使用量
+            （行数を4倍にしても最大メモリ使用量がほぼ変わらないことを確認する）
+- duplicates: ほぼ重複の検出（find_near_duplicates）の所要時間
+            （保存済みが多く、同じ企業・職種のものも多い索引で、生成のたびに確認できる速さかを確認する）
+
+結果は1行1件のJSON（JSON Lines）で標準出力と --output に書き出す
+（Streamlitの実行環境なしで読み込むため警告が出るが、標準エラー出力に分かれている）。
+シートの行数（--sheet-rows）を変えて実行すれば、シートが大きくなったときの劣化を比較できる。
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import uuid
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 索引・送信箱は計測用の一時ディレクトリに作る（実データに触れない）
+BENCH_DIR = tempfile.mkdtemp(prefix="intern-bench-")
+os.environ["POSTING_INDEX_PATH"] = os.path.join(BENCH_DIR, "postings.sqlite3")
+os.environ["OUTBOX_PATH"] = os.path.join(BENCH_DIR, "outbox.sqlite3")
+# レート制限そのものではなく処理のオーバーヘッドを測るため、Sheetsのクォータを十分に緩める
+os.environ.setdefault("SHEETS_READ_REQUESTS_PER_MINUTE", "1000000")
+os.environ.setdefault("SHEETS_WRITE_REQUESTS_PER_MINUTE", "1000000")
+
+BENCH_SPREADSHEET_ID = "bench-spreadsheet"
+BENCH_SHEET_NAME = "info"
+
+def load_app():
+    """app.py を読み込む関数"""
+    import app
+    return app
+
+def sample_args(i):
+    """generate_intern_info に渡すサンプルの引数を返す関数（i ごとに別のインターン情報になる）"""
+    return (
+        f"株式会社ベンチ{i}", "IT・テクノロジー", "ハイブリッド", "東京都渋谷区道玄坂1-2-3",
+        "渋谷駅より徒歩1分", "3ヶ月", "エンジニア", "大学1年生、大学2年生", "時給1500円", "全額支給",
+        "10:00", "19:00", "週3日〜", "週20時間", "・Ruby on Railsを用いたWebアプリケーションの開発経験\n" * 5,
+        "・Webアプリケーションの開発経験\n・コミュニケーション能力", "書類選考 → 面接",
+        "2025-06-30", f"2025-07-{i % 28 + 1:02d}", "3",
+    )
+
+def summarize(samples):
+    """計測値（秒）のリストから統計値を返す関数"""
+    ordered = sorted(samples)
+    return {
+        "runs": len(samples),
+        "mean_seconds": round(statistics.mean(samples), 6),
+        "median_seconds": round(statistics.median(samples), 6),
+        "p95_seconds": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 6),
+    }
+
+def bench_generate(app, args):
+    """generate_intern_info の処理速度を計測する関数"""
+    import intern_info
+
+    count = args.generate_count
+    start = time.perf_counter()
+    infos = [intern_info.generate_intern_info(*sample_args(i)) for i in range(count)]
+    generate_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    intern_info.render_descriptions(infos)
+    render_seconds = time.perf_counter() - start
+    return [
+        {
+            "benchmark": "generate_intern_info",
+            "postings": count,
+            "seconds": round(generate_seconds, 6),
+            "postings_per_second": round(count / generate_seconds, 1),
+        },
+        {
+            "benchmark": "render_descriptions",
+            "postings": count,
+            "seconds": round(render_seconds, 6),
+            "postings_per_second": round(count / render_seconds, 1),
+        },
+    ]
+
+class FakeSheetsHttp:
+    """Sheets APIの応答を返す偽のHTTPクライアント
+
+    httplib2.Http と同じ request() を持ち、googleapiclient にそのまま渡せる。
+    1回の呼び出しごとに latency 秒、応答1MBごとに seconds_per_mb 秒待つことで通信を再現し、
+    呼び出し回数を操作ごとに数える。throttled に回数を入れると、その回数だけ429を返す。
+    """
+
+    def __init__(self, sheet_rows, latency, seconds_per_mb):
+        self.rows = sheet_rows
+        self.latency = latency
+        self.seconds_per_mb = seconds_per_mb
+        self.calls = {}
+        self.titles = [BENCH_SHEET_NAME]
+        # 空行にする行番号（読み込みでは空のリストを返し、範囲の末尾の空行は返さない）
+        self.blank_rows = set()
+        self.throttled = 0
+        # 1回の values.batchUpdate で書き込んだ最大の行数
+        self.max_written_rows = 0
+        self.lock = threading.Lock()
+
+    def count(self, operation):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+
+    def respond(self, payload, status=200):
+        import httplib2
+
+        content = json.dumps(payload).encode("utf-8")
+        time.sleep(self.latency + len(content) / 1_000_000 * self.seconds_per_mb)
+        headers = {"status": status, "content-type": "application/json"}
+        if status == 429:
+            headers["retry-after"] = "0"
+        return httplib2.Response(headers), content
+
+    def request(self, uri, method="GET", body=None, headers=None, redirections=1, connection_type=None):
+        path = uri.split("?", 1)[0]
+        with self.lock:
+            throttled = self.throttled > 0
+            self.throttled -= 1 if throttled else 0
+        if throttled:
+            self.count("429")
+            return self.respond({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}, status=429)
+        if ":append" in path:
+            self.count("values.append")
+            appended = len(json.loads(body)["values"])
+            with self.lock:
+                first_row = self.rows + 1
+                self.rows += appended
+            return self.respond({"updates": {"updatedRange": f"{BENCH_SHEET_NAME}!A{first_row}:U{first_row + appended - 1}"}})
+        if ":batchUpdate" in path and "/values" in path:
+            self.count("values.batchUpdate")
+            data = json.loads(body)["data"]
+            with self.lock:
+                self.max_written_rows = max(self.max_written_rows, sum(len(item["values"]) for item in data))
+            return self.respond({"totalUpdatedRows": len(data)})
+        if ":batchUpdate" in path:
+            self.count("batchUpdate")
+            with self.lock:
+                self.titles += [
+                    request["addSheet"]["properties"]["title"]
+                    for request in json.loads(body)["requests"] if "addSheet" in request
+                ]
+            return self.respond({"replies": [{}]})
+        if "/values:batchGet" in path:
+            self.count("values.batchGet")
+            return self.respond({"valueRanges": []})
+        if "/values/" in path and method == "PUT":
+            self.count("values.update")
+            return self.respond({"updatedRows": 1})
+        if "/values/" in path:
+            self.count("values.get")
+            # 読み込みの場合は範囲内（終わりの行がなければ末尾まで）の行を返す
+            # 1行目はヘッダー行で、データは2行目から self.rows 行ある
+            # 列も範囲の終わりの列までに絞る（説明は最後のU列）
+            bounds = re.search(r"![A-Z]+(\d+):([A-Z]+)(\d*)$", urllib.parse.unquote(path))
+            first = int(bounds.group(1)) if bounds else 2
+            last = min(int(bounds.group(3)), self.rows + 1) if bounds and bounds.group(3) else self.rows + 1
+            width = ord(bounds.group(2)) - ord("A") + 1 if bounds else 21
+            row = (["x" * 20] * 20 + ["説明" * 500])[:width]
+            values = [[] if number in self.blank_rows else row for number in range(max(first, 2), last + 1)]
+            while values and not values[-1]:
+                values.pop()
+            return self.respond({"values": values})
+        self.count("get")
+        with self.lock:
+            titles = list(self.titles)
+        return self.respond({"sheets": [
+            {"properties": {"title": title, "gridProperties": {"rowCount": self.rows + 1}}} for title in titles
+        ]})
+
+def install_fake_sheets(fake):
+    """sheets_store.py が偽のSheets APIを使うように差し替える関数"""
+    from googleapiclient.discovery import build_from_document
+
+    import sheets_store
+    document = sheets_store.get_discovery_document()
+    sheets_store.get_sheet_config = lambda: (BENCH_SPREADSHEET_ID, BENCH_SHEET_NAME)
+    sheets_store.get_google_sheets_service = lambda: build_from_document(document, http=fake)
+    sheets_store.clear_sheets_client_pool()
+    sheets_store.invalidate_sheet_state(BENCH_SPREADSHEET_ID, BENCH_SHEET_NAME)
+
+def bench_sheets(app, args):
+    """save_to_sheets / save_many_to_sheets の呼び出し回数と所要時間を計測する関数"""
+    import intern_info
+    import sheets_store
+
+    results = []
+    offset = 0
+
+    # 1件ずつ保存
+    fake = FakeSheetsHttp(args.sheet_rows, args.latency, args.seconds_per_mb)
+    install_fake_sheets(fake)
+    samples = []
+    for i in range(args.sheets_runs):
+        info = intern_info.generate_intern_info(*sample_args(offset + i))
+        start = time.perf_counter()
+        success, message = sheets_store.save_to_sheets(info)
+        samples.append(time.perf_counter() - start)
+        if not success:
+            raise RuntimeError(message)
+    offset += args.sheets_runs
+    results.append({
+        "benchmark": "save_to_sheets",
+        "sheet_rows": args.sheet_rows,
+        "latency_seconds": args.latency,
+        **summarize(samples),
+        "api_calls": fake.calls,
+        "api_calls_per_posting": round(sum(fake.calls.values()) / args.sheets_runs, 2),
+    })
+
+    # まとめて保存
+    fake = FakeSheetsHttp(args.sheet_rows, args.latency, args.seconds_per_mb)
+    install_fake_sheets(fake)
+    infos = [intern_info.generate_intern_info(*sample_args(offset + i)) for i in range(args.batch_size)]
+    start = time.perf_counter()
+    saved = sheets_store.save_many_to_sheets(infos)
+    seconds = time.perf_counter() - start
+    offset += args.batch_size
+    results.append({
+        "benchmark": "save_many_to_sheets",
+        "sheet_rows": args.sheet_rows,
+        "latency_seconds": args.latency,
+        "postings": args.batch_size,
+        "succeeded": sum(1 for success, _ in saved if success),
+        "seconds": round(seconds, 6),
+        "api_calls": fake.calls,
+        "api_calls_per_posting": round(sum(fake.calls.values()) / args.batch_size, 4),
+    })
+
+    # 同じ内容の再保存（索引によりAPIを呼ばないこと）
+    fake = FakeSheetsHttp(args.sheet_rows, args.latency, args.seconds_per_mb)
+    install_fake_sheets(fake)
+    start = time.perf_counter()
+    sheets_store.save_many_to_sheets(infos)
+    results.append({
+        "benchmark": "save_many_to_sheets_resave",
+        "postings": args.batch_size,
+        "seconds": round(time.perf_counter() - start, 6),
+        "api_calls": fake.calls,
+    })
+
+    # クォータ超過（429）が続いた後のまとめて保存（再試行で保存できること）
+    import metrics
+
+    fake = FakeSheetsHttp(args.sheet_rows, args.latency, args.seconds_per_mb)
+    fake.throttled = 3
+    install_fake_sheets(fake)
+    metrics.reset()
+    infos = [intern_info.generate_intern_info(*sample_args(offset + i)) for i in range(args.batch_size)]
+    start = time.perf_counter()
+    saved = sheets_store.save_many_to_sheets(infos)
+    results.append({
+        "benchmark": "save_many_to_sheets_throttled",
+        "postings": args.batch_size,
+        "succeeded": sum(1 for success, _ in saved if success),
+        "seconds": round(time.perf_counter() - start, 6),
+        "api_calls": fake.calls,
+        "retries": sum(row["再試行"] for row in metrics.snapshot()),
+    })
+
+    # 全件の説明の再生成（ページごとに読み込み、書き込みもページの大きさまでに分けること）
+    fake = FakeSheetsHttp(args.sheet_rows, args.latency, args.seconds_per_mb)
+    install_fake_sheets(fake)
+    start = time.perf_counter()
+    success, message = sheets_store.regenerate_sheet_descriptions()
+    if not success:
+        raise RuntimeError(message)
+    results.append({
+        "benchmark": "regenerate_sheet_descriptions",
+        "sheet_rows": args.sheet_rows,
+        "seconds": round(time.perf_counter() - start, 6),
+        "max_rows_per_write": fake.max_written_rows,
+        "api_calls": fake.calls,
+    })
+    return results
+
+def fake_notion_properties():
+    """偽のNotionデータベースのプロパティの定義（選択肢は一括取り込みと同じもの）を返す関数"""
+    import intern_info
+    import posting
+
+    properties = {}
+    for name, kind in posting.SCHEMA:
+        if kind is None:
+            continue
+        definition = {"id": name, "name": name, "type": kind, kind: {}}
+        if kind == "select":
+            definition[kind] = {"options": [{"name": option} for option in intern_info.IMPORT_COLUMNS[name]]}
+        properties[name] = definition
+    return properties
+
+class FakeNotionHandler(BaseHTTPRequestHandler):
+    """Notion APIの代わりに /v1/pages・/v1/blocks・/v1/databases・/v1/data_sources への要求に応答するハンドラー"""
+
+    latency = 0.0
+    lock = threading.Lock()
+    calls = {}
+    # ページID: [(ブロックID, ブロック)]（ページの本文）
+    bodies = {}
+
+    def read_payload(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def path_parts(self):
+        # 例: /v1/blocks/<ID>/children → ["v1", "blocks", "<ID>", "children"]
+        return self.path.split("?", 1)[0].strip("/").split("/")
+
+    def page(self, page_id):
+        return {"object": "page", "id": page_id, "url": f"https://www.notion.so/{page_id}"}
+
+    def do_GET(self):
+        parts = self.path_parts()
+        if parts[1] == "databases":
+            self.respond("databases.retrieve", {
+                "object": "database",
+                "id": parts[2],
+                "data_sources": [{"id": "bench-data-source", "name": "インターン情報"}],
+            })
+        elif parts[1] == "blocks":
+            with self.lock:
+                blocks = list(self.bodies.get(parts[2], []))
+            self.respond("blocks.children.list", {
+                "object": "list",
+                "results": [dict(block, id=block_id) for block_id, block in blocks],
+                "has_more": False,
+                "next_cursor": None,
+            })
+        else:
+            self.respond("data_sources.retrieve", {
+                "object": "data_source",
+                "id": parts[2],
+                "properties": fake_notion_properties(),
+            })
+
+    def do_POST(self):
+        children = self.read_payload().get("children", [])
+        page_id = uuid.uuid4().hex
+        with self.lock:
+            self.bodies[page_id] = [(uuid.uuid4().hex, block) for block in children]
+        self.respond("pages.create", self.page(page_id))
+
+    def do_PATCH(self):
+        payload = self.read_payload()
+        parts = self.path_parts()
+        if parts[1] == "blocks":
+            with self.lock:
+                self.bodies.setdefault(parts[2], []).extend(
+                    (uuid.uuid4().hex, block) for block in payload.get("children", [])
+                )
+            self.respond("blocks.children.append", {"object": "list", "results": []})
+        else:
+            self.respond("pages.update", self.page(parts[2]))
+
+    def do_DELETE(self):
+        block_id = self.path_parts()[2]
+        with self.lock:
+            for blocks in self.bodies.values():
+                blocks[:] = [entry for entry in blocks if entry[0] != block_id]
+        self.respond("blocks.delete", {"object": "block", "id": block_id, "archived": True})
+
+    def respond(self, operation, payload):
+        with self.lock:
+            self.calls[operation] = self.calls.get(operation, 0) + 1
+        time.sleep(self.latency)
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def bench_notion(app, args):
+    """create_notion_page / create_notion_pages の所要時間を計測する関数"""
+    from notion_client import Client
+
+    import intern_info
+    import notion_store
+    FakeNotionHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeNotionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    try:
+        os.environ["NOTION_TOKEN"] = "bench-token"
+        os.environ["NOTION_DATABASE_ID"] = "bench-database"
+        # 本番と同じく、クライアントは1つだけ作って使い回す
+        client = Client(auth="bench-token", base_url=base_url, retry=False)
+        notion_store.get_notion_client = lambda token: client
+        # レート制限そのものではなく処理のオーバーヘッドを測るため、制限を十分に緩める
+        notion_store.NOTION_REQUESTS_PER_SECOND = args.notion_rate
+
+        results = []
+        FakeNotionHandler.calls = {}
+        samples = []
+        created = []
+        for i in range(args.notion_runs):
+            info = intern_info.generate_intern_info(*sample_args(100_000 + i))
+            created.append(info)
+            start = time.perf_counter()
+            success, message = notion_store.create_notion_page(info)
+            samples.append(time.perf_counter() - start)
+            if not success:
+                raise RuntimeError(message)
+        results.append({
+            "benchmark": "create_notion_page",
+            "latency_seconds": args.latency,
+            **summarize(samples),
+            "api_calls": dict(FakeNotionHandler.calls),
+        })
+
+        # 説明だけを変えて送信し直すと、ページの本文も書き換わる
+        FakeNotionHandler.calls = {}
+        samples = []
+        for info in created:
+            start = time.perf_counter()
+            success, message = notion_store.create_notion_page(info._replace(説明=info["説明"] + "\n（更新）"))
+            samples.append(time.perf_counter() - start)
+            if not success:
+                raise RuntimeError(message)
+        with FakeNotionHandler.lock:
+            updated_bodies = sum(
+                1 for blocks in FakeNotionHandler.bodies.values()
+                if blocks and notion_store.block_text(blocks[-1][1])[1].endswith("（更新）")
+            )
+        results.append({
+            "benchmark": "create_notion_page_update",
+            "latency_seconds": args.latency,
+            **summarize(samples),
+            "updated_bodies": updated_bodies,
+            "api_calls": dict(FakeNotionHandler.calls),
+        })
+
+        FakeNotionHandler.calls = {}
+        infos = [intern_info.generate_intern_info(*sample_args(200_000 + i)) for i in range(args.batch_size)]
+        start = time.perf_counter()
+        sent = notion_store.create_notion_pages(infos, requests_per_second=args.notion_rate)
+        results.append({
+            "benchmark": "create_notion_pages",
+            "latency_seconds": args.latency,
+            "requests_per_second_limit": args.notion_rate,
+            "postings": args.batch_size,
+            "succeeded": sum(1 for success, _ in sent if success),
+            "seconds": round(time.perf_counter() - start, 6),
+            "api_calls": dict(FakeNotionHandler.calls),
+        })
+
+        # データベースの定義に合わないもの（選択肢にない業界・数値でない募集人数）は送信前に失敗する
+        FakeNotionHandler.calls = {}
+        invalid = [
+            intern_info.generate_intern_info(*sample_args(300_000 + i))._replace(業界="宇宙開発", 募集人数="若干名")
+            for i in range(args.batch_size)
+        ]
+        start = time.perf_counter()
+        sent = notion_store.create_notion_pages(invalid, requests_per_second=args.notion_rate)
+        results.append({
+            "benchmark": "create_notion_pages_invalid",
+            "postings": args.batch_size,
+            "rejected": sum(1 for success, _ in sent if not success),
+            "seconds": round(time.perf_counter() - start, 6),
+            "api_calls": dict(FakeNotionHandler.calls),
+        })
+        return results
+    finally:
+        server.shutdown()
+
+def bench_export(app, args):
+    """全件エクスポートの所要時間と最大メモリ使用量を形式ごとに計測する関数"""
+    import export
+
+    results = []
+    for export_format in export.EXPORT_FORMATS:
+        for rows in (args.export_rows, args.export_rows * 4):
+            fake = FakeSheetsHttp(rows, 0, 0)
+            install_fake_sheets(fake)
+            path = os.path.join(BENCH_DIR, f"export.{export_format}")
+            # クライアントの作成やgoogleapiclientが一度だけ作るキャッシュは件数に関係ないので、
+            # 1行だけのシートで一度実行してから計測する
+            fake.rows = 1
+            app.write_export(path, export_format)
+            fake.rows = rows
+            fake.calls.clear()
+            tracemalloc.start()
+            start = time.perf_counter()
+            count = app.write_export(path, export_format)
+            seconds = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            results.append({
+                "benchmark": f"export_{export_format}",
+                "postings": count,
+                "seconds": round(seconds, 6),
+                "peak_memory_mb": round(peak / 1_000_000, 2),
+                "file_size_mb": round(os.path.getsize(path) / 1_000_000, 2),
+                "api_calls": fake.calls,
+            })
+    return results
+
+def bench_duplicates(app, args):
+    """ほぼ重複の検出の所要時間を計測する関数"""
+    import intern_info
+    import near_duplicates
+
+    # 別々の企業のインターン情報と、同じ企業・職種で内容が少しずつ違うインターン情報を登録する
+    start = time.perf_counter()
+    near_duplicates.record_postings(
+        intern_info.generate_intern_info(*sample_args(300_000 + i)) for i in range(args.duplicate_rows)
+    )
+    same_block = []
+    for i in range(args.duplicate_block_rows):
+        values = list(sample_args(0))
+        values[3] = f"東京都渋谷区道玄坂{i}-1"
+        values[14] = f"・業務{i}の経験\n・ツール{i * 7}の知識"
+        # 開始予定日が違えば別のインターン情報（キーが重ならないようにする）
+        values[18] = f"{2026 + i // 336}-{i // 28 % 12 + 1:02d}-{i % 28 + 1:02d}"
+        same_block.append(intern_info.generate_intern_info(*values))
+    near_duplicates.record_postings(same_block)
+    record_seconds = time.perf_counter() - start
+
+    # 同じ企業・職種の1件を少しだけ変えて、開始予定日を変えたもの（見つかるべきもの）
+    values = list(sample_args(0))
+    values[3] = "東京都渋谷区道玄坂0-1"
+    values[14] = "・業務0の経験\n・ツール0の知識と実務経験"
+    values[18] = "2027-01-01"
+    edited = intern_info.generate_intern_info(*values)
+    samples = []
+    for _ in range(args.duplicate_runs):
+        start = time.perf_counter()
+        matches = near_duplicates.find_near_duplicates(edited)
+        samples.append(time.perf_counter() - start)
+    return [{
+        "benchmark": "find_near_duplicates",
+        "indexed_postings": args.duplicate_rows + args.duplicate_block_rows,
+        "same_block_postings": args.duplicate_block_rows,
+        "record_seconds": round(record_seconds, 6),
+        **summarize(samples),
+        "matches": len(matches),
+        "best_similarity": round(matches[0][0], 3) if matches else None,
+    }]
+
+BENCHMARKS = {
+    "generate": bench_generate,
+    "sheets": bench_sheets,
+    "notion": bench_notion,
+    "export": bench_export,
+    "duplicates": bench_duplicates,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="インターン情報の生成・保存処理のベンチマーク")
+    parser.add_argument("benchmarks", nargs="*", help=f"実行するベンチマーク（{', '.join(BENCHMARKS)}。省略時はすべて）")
+    parser.add_argument("--output", help="結果を追記するJSON Linesファイル")
+    parser.add_argument("--generate-count", type=int, default=10_000, help="生成するインターン情報の件数")
+    parser.add_argument("--sheet-rows", type=int, default=1_000, help="偽のシートにある既存の行数")
+    parser.add_argument("--latency", type=float, default=0.05, help="API呼び出し1回あたりの遅延（秒）")
+    parser.add_argument("--seconds-per-mb", type=float, default=0.1, help="応答1MBあたりの転送時間（秒）")
+    parser.add_argument("--sheets-runs", type=int, default=20, help="1件ずつ保存する回数")
+    parser.add_argument("--notion-runs", type=int, default=20, help="Notionに1件ずつ送信する回数")
+    parser.add_argument("--batch-size", type=int, default=100, help="まとめて保存・送信する件数")
+    parser.add_argument("--export-rows", type=int, default=5_000, help="エクスポートする行数（この4倍の行数でも計測する）")
+    parser.add_argument("--duplicate-rows", type=int, default=10_000, help="ほぼ重複の索引に登録する別々の企業のインターン情報の件数")
+    parser.add_argument("--duplicate-block-rows", type=int, default=200, help="ほぼ重複の索引に登録する同じ企業・職種のインターン情報の件数")
+    parser.add_argument("--duplicate-runs", type=int, default=100, help="ほぼ重複を確認する回数")
+    parser.add_argument("--notion-rate", type=float, default=1_000.0, help="Notionへの送信レートの上限（リクエスト/秒）")
+    args = parser.parse_args()
+
+    names = args.benchmarks or list(BENCHMARKS)
+    unknown = [name for name in names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"不明なベンチマーク: {', '.join(unknown)}")
+
+    app = load_app()
+    started_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    lines = []
+    for name in names:
+        for result in BENCHMARKS[name](app, args):
+            lines.append(json.dumps({"started_at": started_at, **result}, ensure_ascii=False))
+            print(lines[-1], flush=True)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+if __name__ == "__main__":
+    main()
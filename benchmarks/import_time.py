@@ -0,0 +1,74 @@
+"""app.py の読み込み時間を計測し、予算内に収まっているか確認するスクリプト
+
+使い方:
+    python benchmarks/import_time.py [--budget 秒] [--repeat 回数]
+
+Streamlit本体の読み込み時間を差し引いた app.py 自身の読み込み時間と、
+起動時に読み込まれてはいけない重いライブラリが読み込まれていないかを確認する。
+結果はJSONで標準出力に書き出し、予算超過時は終了コード1を返す。
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 初回描画までに読み込まれてはいけないモジュール
+HEAVY_MODULES = ["googleapiclient", "google.oauth2", "pandas", "notion_client"]
+
+# app.py 自身の読み込みにかけてよい時間（秒、Streamlit本体を除く）
+DEFAULT_BUDGET_SECONDS = 0.3
+
+MEASURE_CODE = """
+import json, sys, time
+start = time.perf_counter()
+import streamlit
+streamlit_seconds = time.perf_counter() - start
+start = time.perf_counter()
+import app
+app_seconds = time.perf_counter() - start
+print(json.dumps({
+    "streamlit_seconds": streamlit_seconds,
+    "app_seconds": app_seconds,
+    "loaded_heavy_modules": [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+def measure_once():
+    """新しいプロセスで app.py を読み込み、計測結果を返す関数"""
+    output = subprocess.run(
+        [sys.executable, "-c", MEASURE_CODE],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    # Streamlitのbareモードの警告などが混ざるので最後の行だけを使う
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description="app.py の読み込み時間を計測する")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET_SECONDS, help="app.py の読み込み時間の上限（秒）")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（中央値を使う）")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.repeat)]
+    app_seconds = sorted(run["app_seconds"] for run in runs)[len(runs) // 2]
+    streamlit_seconds = sorted(run["streamlit_seconds"] for run in runs)[len(runs) // 2]
+    loaded_heavy_modules = sorted({name for run in runs for name in run["loaded_heavy_modules"]})
+
+    report = {
+        "benchmark": "import_time",
+        "streamlit_seconds": round(streamlit_seconds, 4),
+        "app_seconds": round(app_seconds, 4),
+        "budget_seconds": args.budget,
+        "loaded_heavy_modules": loaded_heavy_modules,
+        "ok": app_seconds <= args.budget and not loaded_heavy_modules,
+    }
+    print(json.dumps(report, ensure_ascii=False))
+    return 0 if report["ok"] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""インターン情報の一括保存（コマンドライン）
+
+Streamlitの画面を起動せずに、ファイルまたは標準入力からインターン情報を読み込み、
+有効なすべての保存先（スプレッドシート・Notion・ローカルファイル）に batch-size 件ずつ保存する。
+夜間の一括登録など、バッチ処理から使う。
+
+使い方:
+    python cli.py postings.csv
+    python cli.py postings.xlsx --dry-run
+    cat postings.jsonl | python cli.py - --format jsonl
+    python cli.py --index-existing
+    python cli.py --refresh-discovery
+
+- csv / excel: 画面の一括取り込みと同じ列（企業名・業界など）から説明文を生成して保存する
+- jsonl: エクスポートやJSONLの保存先で書き出した、生成済みのインターン情報をそのまま保存する
+
+Googleの認証情報とスプレッドシートは .streamlit/secrets.toml または環境変数
+（GOOGLE_APPLICATION_CREDENTIALS・SPREADSHEET_ID・SHEET_NAME）で設定する。
+保存できなかったものと、保存済みのものとほぼ同じもの（保存はする）は標準エラー出力に書き出し、
+件数の集計をJSONで標準出力に書き出す。
+読み込めない行や保存に失敗したものが1件でもあれば終了コード1を返す。
+
+--index-existing は、ほぼ重複の検出用の索引に保存済みの全インターン情報を登録する
+（この機能より前に保存したものを比べる相手にするため、最初に1回だけ実行する）。
+--refresh-discovery は、ローカルに保存したSheets APIのディスカバリードキュメントを最新のものに更新する
+（Sheets APIに新しい機能が加わったときなどに実行する。失敗した場合は終了コード2）。
+"""
+import argparse
+import json
+import sys
+
+import streamlit.logger
+
+# 画面なしでキャッシュを使うときの警告（ScriptRunContext がない）を出さない
+streamlit.logger.set_log_level("error")
+
+import intern_info
+import near_duplicates
+import posting
+import sheets_store
+import sinks
+
+INPUT_FORMATS = ["csv", "excel", "jsonl"]
+# 1回にまとめて保存する件数
+CLI_BATCH_SIZE = 500
+# 索引に登録するときに1回にまとめて記録する件数
+INDEX_BATCH_SIZE = 1000
+
+def guess_format(path):
+    """ファイル名の拡張子から入力形式を決める関数（標準入力はCSV）"""
+    name = path.lower()
+    if name.endswith((".xlsx", ".xls")):
+        return "excel"
+    if name.endswith((".jsonl", ".ndjson")):
+        return "jsonl"
+    return "csv"
+
+def iter_jsonl_batches(file, batch_size):
+    """JSON Linesのインターン情報を batch_size 件ずつ (レコードのリスト, [(行番号, エラー)]) で返すジェネレーター"""
+    infos, errors = [], []
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            infos.append(posting.from_mapping(json.loads(line)))
+        except KeyError as e:
+            errors.append((line_number, f"必須項目が不足しています: {str(e)}"))
+        except (ValueError, TypeError) as e:
+            errors.append((line_number, f"JSONとして読み込めません: {str(e)}"))
+        if len(infos) >= batch_size:
+            yield infos, errors
+            infos, errors = [], []
+    if infos or errors:
+        yield infos, errors
+
+def iter_table_batches(file, batch_size, excel=False):
+    """CSV/Excelの各行からインターン情報を生成し、batch_size 行ずつ (レコードのリスト, [(行番号, エラー)]) で返すジェネレーター"""
+    # 1行目はヘッダー行
+    first_row = 2
+    for df in intern_info.iter_postings_file(file, batch_size, excel=excel):
+        infos, error_rows = intern_info.build_postings_from_dataframe(df, first_row)
+        errors = list(zip(error_rows["行"], error_rows["エラー"]))
+        if any(row is None for row, _ in errors):
+            # 列が足りない場合はどの行も生成できない
+            raise ValueError(errors[0][1])
+        first_row += len(df)
+        yield infos, errors
+
+def iter_batches(file, input_format, batch_size):
+    """入力形式に合わせて batch_size 件ずつ (レコードのリスト, [(行番号, エラー)]) を返す関数"""
+    if input_format == "jsonl":
+        return iter_jsonl_batches(file, batch_size)
+    return iter_table_batches(file, batch_size, excel=input_format == "excel")
+
+def save_postings(batches, sink_list, dry_run=False, log=sys.stderr):
+    """インターン情報をまとめて保存先に保存し、件数の集計を返す関数
+
+    読み込めなかった行・保存に失敗したもの・保存済みのものとほぼ同じもの（保存はする）は log に書き出す。
+    """
+    summary = {
+        "postings": 0,
+        "invalid": 0,
+        "near_duplicates": 0,
+        "sinks": {sink.name: {"succeeded": 0, "failed": 0} for sink in sink_list},
+    }
+    for infos, errors in batches:
+        for row, message in errors:
+            print(f"{row}行目: {message}", file=log)
+        summary["invalid"] += len(errors)
+        summary["postings"] += len(infos)
+        for info, matches in zip(infos, near_duplicates.find_near_duplicates_many(infos)):
+            if matches:
+                summary["near_duplicates"] += 1
+                print(f"ほぼ重複: {info['インターン名']}（開始予定日: {info['開始予定日']}）→ {near_duplicates.describe(matches)}", file=log)
+        if dry_run or not infos:
+            continue
+        for name, results in sinks.dispatch(sink_list, infos).items():
+            for info, (success, message) in zip(infos, results):
+                if success:
+                    summary["sinks"][name]["succeeded"] += 1
+                else:
+                    summary["sinks"][name]["failed"] += 1
+                    print(f"[{name}] {info['インターン名']}: {message}", file=log)
+        print(f"{summary['postings']}件を処理しました", file=log, flush=True)
+    return summary
+
+def index_existing_postings(log=sys.stderr):
+    """スプレッドシート上の全インターン情報を、ほぼ重複の検出用の索引に登録する関数（登録した件数を返す）"""
+    count = 0
+    batch = []
+    for info in sheets_store.iter_sheet_postings():
+        batch.append(info)
+        if len(batch) >= INDEX_BATCH_SIZE:
+            near_duplicates.record_postings(batch)
+            count += len(batch)
+            batch = []
+            print(f"{count}件を登録しました", file=log, flush=True)
+    near_duplicates.record_postings(batch)
+    return count + len(batch)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="インターン情報をファイルまたは標準入力から一括保存する")
+    parser.add_argument("input", nargs="?", help="読み込むファイル（- で標準入力）")
+    parser.add_argument("--format", choices=INPUT_FORMATS, help="入力形式（省略時はファイルの拡張子から判断し、標準入力はcsv）")
+    parser.add_argument("--batch-size", type=int, default=CLI_BATCH_SIZE, help="1回にまとめて保存する件数")
+    parser.add_argument("--dry-run", action="store_true", help="読み込みと生成だけを行い、保存しない")
+    parser.add_argument("--index-existing", action="store_true", help="保存済みの全インターン情報をほぼ重複の検出用の索引に登録する")
+    parser.add_argument("--refresh-discovery", action="store_true", help="Sheets APIのディスカバリードキュメントを最新のものに更新する")
+    args = parser.parse_args(argv)
+    if args.refresh_discovery:
+        success, message = sheets_store.refresh_discovery_document()
+        print(message, file=sys.stderr)
+        print(json.dumps({"discovery_refreshed": success}, ensure_ascii=False))
+        return 0 if success else 2
+    if args.index_existing:
+        try:
+            count = index_existing_postings()
+        except Exception as e:
+            print(f"索引への登録に失敗しました: {str(e)}", file=sys.stderr)
+            return 2
+        print(json.dumps({"indexed": count}, ensure_ascii=False))
+        return 0
+    if args.input is None:
+        parser.error("読み込むファイルを指定してください（- で標準入力）")
+    if args.batch_size < 1:
+        parser.error("--batch-size は1以上を指定してください")
+
+    input_format = args.format or ("csv" if args.input == "-" else guess_format(args.input))
+    sink_list = [] if args.dry_run else sinks.get_enabled_sinks()
+    try:
+        if args.input == "-":
+            file = sys.stdin if input_format == "jsonl" else sys.stdin.buffer
+        else:
+            file = open(args.input, encoding="utf-8") if input_format == "jsonl" else open(args.input, "rb")
+        with file:
+            summary = save_postings(iter_batches(file, input_format, args.batch_size), sink_list, args.dry_run)
+    except (OSError, ValueError) as e:
+        print(f"読み込みに失敗しました: {str(e)}", file=sys.stderr)
+        return 2
+
+    print(json.dumps(summary, ensure_ascii=False))
+    failed = summary["invalid"] + sum(counts["failed"] for counts in summary["sinks"].values())
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""保存済みインターン情報の一括エクスポート
+
+インターン情報のレコードを1件ずつ受け取り、CSV・JSON Lines・Markdownファイルのzipの
+いずれかの形式のバイト列を少しずつ返すジェネレーター。全件をメモリに載せないので、
+件数が増えても使用メモリはほぼ一定のまま出力できる。
+"""
+import csv
+import io
+import json
+import re
+import zipfile
+
+import posting
+
+# この件数ごとに出力をまとめて返す
+EXPORT_CHUNK_POSTINGS = 500
+
+def _chunks(postings, size=EXPORT_CHUNK_POSTINGS):
+    chunk = []
+    for info in postings:
+        chunk.append(info)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def iter_csv(postings):
+    """CSV（Excelで開けるようにBOM付きUTF-8）を少しずつ返すジェネレーター"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(posting.FIELDS)
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    for chunk in _chunks(postings):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode("utf-8")
+
+def iter_jsonl(postings):
+    """JSON Lines（1行に1件のJSONオブジェクト）を少しずつ返すジェネレーター"""
+    for chunk in _chunks(postings):
+        yield "".join(
+            json.dumps(info._asdict(), ensure_ascii=False, default=str) + "\n" for info in chunk
+        ).encode("utf-8")
+
+class _StreamBuffer(io.RawIOBase):
+    """書き込まれたバイト列を取り出すまで溜めておく、シークできない書き込み先
+
+    zipfile はシークできない書き込み先にも書けるので、ファイルを1つ書くごとに取り出して返す。
+    """
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def pop(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def markdown_filename(number, info):
+    """Markdownファイルの名前を返す関数（通し番号を付けて重複しないようにする）"""
+    name = re.sub(r'[\\/:*?"<>|\s]+', "_", f"{info['企業名']}_{info['職種']}").strip("_")
+    return f"{number:06d}_{name[:80]}.md"
+
+def to_markdown(info):
+    """インターン情報を1件分のMarkdownに変換する関数"""
+    return f"# {info['インターン名']}\n\n{info['説明'].strip()}\n"
+
+def iter_markdown_zip(postings):
+    """1件1ファイルのMarkdownをまとめたzipを少しずつ返すジェネレーター"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        number = 0
+        for chunk in _chunks(postings):
+            for info in chunk:
+                number += 1
+                archive.writestr(markdown_filename(number, info), to_markdown(info))
+            yield buffer.pop()
+    # 中央ディレクトリ（zipの目次）は閉じたときに書き込まれる
+    yield buffer.pop()
+
+# 形式名: (表示名, ファイルの拡張子, MIMEタイプ, 出力するジェネレーター)
+EXPORT_FORMATS = {
+    "csv": ("CSV", "csv", "text/csv", iter_csv),
+    "jsonl": ("JSON Lines", "jsonl", "application/x-ndjson", iter_jsonl),
+    "markdown": ("Markdown（zip）", "zip", "application/zip", iter_markdown_zip),
+}
+
+def iter_export(postings, export_format):
+    """指定した形式でエクスポートのバイト列を少しずつ返すジェネレーター"""
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"エクスポートできない形式です: {export_format}（{'、'.join(EXPORT_FORMATS)} のいずれか）")
+    return EXPORT_FORMATS[export_format][3](postings)
@@ -0,0 +1,397 @@
+"""インターン情報の生成
+
+入力項目の選択肢・説明文のテンプレート・CSV/Excelからの一括生成を定義する。
+画面表示やGoogle APIには依存しないので、バッチ処理からもそのまま使える。
+"""
+import string
+
+import streamlit as st
+
+import posting
+import settings
+
+# 選択肢の定義
+INDUSTRIES = [
+    "IT・テクノロジー",
+    "金融・保険",
+    "製造・メーカー",
+    "商社・流通",
+    "サービス",
+    "広告・マーケティング",
+    "コンサルティング",
+    "メディア・エンターテインメント",
+    "小売・流通",
+    "不動産・建設",
+    "医療・ヘルスケア",
+    "教育",
+    "エネルギー・資源",
+    "運輸・物流",
+    "その他"
+]
+
+WORK_TYPES = [
+    "対面",
+    "オンライン",
+    "ハイブリッド"
+]
+
+# 24時間（30分単位）の時間リストを生成
+def generate_time_list():
+    times = []
+    for hour in range(24):
+        for minute in [0, 30]:
+            time_str = f"{hour:02d}:{minute:02d}"
+            times.append(time_str)
+    times.append("フレックス制")
+    return times
+
+TIMES = generate_time_list()
+
+WORKING_DAYS = [
+    "週1日",
+    "週2日",
+    "週3日",
+    "週4日",
+    "週5日",
+    "週1日〜",
+    "週2日〜",
+    "週3日〜",
+    "週4日〜",
+    "週5日〜",
+    "その他"
+]
+
+TRANSPORTATION_FEES = [
+    "支給なし",
+    "一部支給",
+    "全額支給",
+    "その他"
+]
+
+PERIODS = [
+    "1日",
+    "2日",
+    "3日",
+    "1週間",
+    "2週間",
+    "3週間",
+    "1ヶ月",
+    "2ヶ月",
+    "3ヶ月",
+    "夏季（7-8月）",
+    "冬季（12-1月）",
+    "春季（3-4月）",
+    "通年",
+    "その他"
+]
+
+POSITIONS = [
+    "エンジニア",
+    "デザイナー",
+    "マーケティング",
+    "営業",
+    "企画",
+    "人事",
+    "経理・財務",
+    "法務",
+    "その他"
+]
+
+GRADES = [
+    "大学1年生",
+    "大学2年生",
+    "大学3年生",
+    "大学4年生",
+    "大学院1年生",
+    "大学院2年生",
+    "その他"
+]
+
+SALARIES = [
+    "無給",
+    "時給1,000円",
+    "時給1,500円",
+    "時給2,000円",
+    "日給10,000円",
+    "日給15,000円",
+    "その他"
+]
+
+SELECTION_PROCESS = [
+    "書類選考 → 面接",
+    "書類選考 → グループディスカッション → 面接",
+    "書類選考 → 筆記試験 → 面接",
+    "書類選考 → グループワーク → 面接",
+    "その他"
+]
+
+# 説明文のテンプレート（{列名} の部分にインターン情報の値が入る）
+STANDARD_DESCRIPTION_TEMPLATE = """
+【募集要項】
+###### 募集職種
+{職種}
+
+###### 雇用形態
+アルバイト
+
+###### 給与
+{報酬}
+
+###### 交通費
+{交通費}
+
+###### 勤務地
+{勤務地}
+
+###### 最寄り駅
+{最寄り駅}
+
+###### 勤務可能時間
+{勤務可能時間}
+
+###### 勤務日数
+{勤務日数}
+
+###### 勤務時間
+{勤務時間}
+
+###### 勤務期間
+{期間}
+
+###### 業界
+{業界}
+
+###### 業種
+{職種}
+
+###### 形式
+{形式}
+
+###### 勤務時間
+・期間：{開始予定日}〜{期間}以上勤務できる方
+・稼働時間：{勤務時間}以上勤務できる方
+・勤務時間：{勤務可能時間}内（土日祝日を除く）
+
+###### 応募条件
+・{募集対象}大歓迎！
+
+###### 必須スキル
+{必須スキル}
+
+###### 歓迎スキル
+{歓迎スキル}
+
+###### 選考フロー
+{選考フロー}
+
+###### 応募締切
+{応募締切}
+
+###### 募集人数
+{募集人数}名
+"""
+
+# テンプレート名: テンプレート本文
+DESCRIPTION_TEMPLATES = {
+    "標準": STANDARD_DESCRIPTION_TEMPLATE,
+    # Notionの見出しレベルに合わせたもの
+    "Notion形式": STANDARD_DESCRIPTION_TEMPLATE.replace("###### ", "### "),
+}
+DEFAULT_TEMPLATE_NAME = "標準"
+
+def load_company_templates():
+    """企業ごとに使うテンプレート（企業名: テンプレート名）の設定を読み込む関数
+
+    シークレットの COMPANY_TEMPLATES テーブル、または環境変数 COMPANY_TEMPLATES のJSON
+    （例: {"株式会社サンプル": "Notion形式"}）で指定する。読み込めない設定や、ないテンプレート名は使わない。
+    """
+    try:
+        company_templates = settings.get_optional_mapping("COMPANY_TEMPLATES")
+    except (TypeError, ValueError) as e:
+        print(f"COMPANY_TEMPLATES を読み込めません: {str(e)}")
+        return {}
+    unknown = {company: name for company, name in company_templates.items() if name not in DESCRIPTION_TEMPLATES}
+    if unknown:
+        print(f"COMPANY_TEMPLATES にないテンプレート名があるため使いません: {unknown}")
+    return {str(company): name for company, name in company_templates.items() if company not in unknown}
+
+# 企業ごとに使うテンプレート（企業名: テンプレート名）。生成のたびに設定を読まないように起動時に1回だけ読み込む
+COMPANY_TEMPLATES = load_company_templates()
+
+def compile_template(name, text):
+    """テンプレートを解析し、使われている列名を検証して描画関数を返す関数
+    
+    項目名の置き換え部分はレコードの列番号に変換しておき、描画時は format(*レコード) だけで済ませる。
+    """
+    parts = []
+    for literal_text, field_name, format_spec, conversion in string.Formatter().parse(text):
+        parts.append(literal_text.replace("{", "{{").replace("}", "}}"))
+        if field_name is None:
+            continue
+        if field_name not in posting.FIELDS or field_name == "説明" or format_spec or conversion:
+            raise ValueError(f"テンプレート「{name}」に使えない項目があります: {{{field_name}}}")
+        parts.append(f"{{{posting.FIELDS.index(field_name)}}}")
+    positional = "".join(parts)
+    return lambda info: positional.format(*posting.from_mapping(info))
+
+@st.cache_resource
+def get_template_renderers():
+    """全テンプレートを起動時に1回だけ解析し、テンプレート名と描画関数の対応を返す関数"""
+    return {name: compile_template(name, text) for name, text in DESCRIPTION_TEMPLATES.items()}
+
+def resolve_template_name(company, template_name=None):
+    """明示指定 → 企業ごとの設定 → 既定 の順で使うテンプレート名を決める関数"""
+    if template_name:
+        return template_name
+    return COMPANY_TEMPLATES.get(company, DEFAULT_TEMPLATE_NAME)
+
+def render_descriptions(infos, template_name=None):
+    """複数のインターン情報の説明文をまとめて描画する関数"""
+    renderers = get_template_renderers()
+    return [
+        renderers[resolve_template_name(info["企業名"], template_name)](info)
+        for info in infos
+    ]
+
+def generate_intern_info(company, industry, work_type, location, nearest_station, period, position, grade, salary, 
+                        transportation_fee, start_time, end_time, working_days, working_time_per_week, skills, required_skills,
+                        selection_process, deadline, start_date, capacity, template_name=None):
+    intern_name = f"{company} {position}インターンシップ"
+    working_hours = f"{start_time}〜{end_time}" if start_time != "フレックス制" and end_time != "フレックス制" else "フレックス制"
+    # 説明以外の項目（posting.SCHEMA の列順。説明は最後の列）
+    fields = (
+        intern_name, company, industry, work_type, location, nearest_station,
+        period, position, grade, salary, transportation_fee, working_hours,
+        working_days, working_time_per_week, selection_process, deadline, start_date,
+        capacity, required_skills, skills
+    )
+    renderer = get_template_renderers()[resolve_template_name(company, template_name)]
+    return posting.Posting._make(fields + (renderer(posting.Posting._make(fields + ("",))),))
+
+# 一括取り込み用の列定義（列名: 選択肢のリスト。None は自由入力）
+IMPORT_COLUMNS = {
+    "企業名": None,
+    "業界": INDUSTRIES,
+    "形式": WORK_TYPES,
+    "勤務地": None,
+    "最寄り駅": None,
+    "期間": PERIODS,
+    "職種": POSITIONS,
+    "募集対象": None,
+    "報酬": None,
+    "交通費": None,
+    "開始時間": TIMES,
+    "終了時間": TIMES,
+    "勤務日数": None,
+    "勤務時間": None,
+    "選考フロー": SELECTION_PROCESS,
+    "応募締切": None,
+    "開始予定日": None,
+    "募集人数": None,
+    "必須スキル": None,
+    "歓迎スキル": None,
+}
+# 空欄でもよい列
+IMPORT_OPTIONAL_COLUMNS = ["最寄り駅", "募集対象", "歓迎スキル"]
+# 任意で指定できるテンプレート名の列（空欄・列なしの場合は企業ごとの設定または既定）
+IMPORT_TEMPLATE_COLUMN = "テンプレート"
+
+def clean_postings_frame(df):
+    """読み込んだDataFrameの列名と値の前後の空白を取り除き、空欄を空文字にする関数"""
+    df.columns = [str(column).strip() for column in df.columns]
+    return df.fillna("").apply(lambda column: column.str.strip())
+
+def read_postings_file(uploaded_file):
+    """アップロードされたCSV/Excelファイルを文字列のDataFrameとして読み込む関数"""
+    import pandas as pd
+    
+    if uploaded_file.name.lower().endswith((".xlsx", ".xls")):
+        df = pd.read_excel(uploaded_file, dtype=str)
+    else:
+        df = pd.read_csv(uploaded_file, dtype=str, encoding="utf-8-sig")
+    return clean_postings_frame(df)
+
+def iter_postings_file(file, chunk_rows, excel=False):
+    """CSV/Excelファイルを chunk_rows 行ずつ文字列のDataFrameとして返すジェネレーター
+    
+    CSVは chunk_rows 行ずつ読み込むので、大きなファイルでも全体をメモリに載せない
+    （Excelは一度に読み込んでから分ける）。file はパスまたはバイナリのファイルオブジェクト。
+    """
+    import pandas as pd
+    
+    if excel:
+        df = clean_postings_frame(pd.read_excel(file, dtype=str))
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows]
+        return
+    for df in pd.read_csv(file, dtype=str, encoding="utf-8-sig", chunksize=chunk_rows):
+        yield clean_postings_frame(df)
+
+def build_postings_from_dataframe(df, first_row=2):
+    """DataFrameの各行を検証し、インターン情報をまとめて生成する関数
+    
+    戻り値は (生成したインターン情報のリスト, エラー内容のDataFrame)。
+    検証は列単位でまとめて行い、エラーのない行だけを生成する。
+    first_row は df の先頭行のファイル上の行番号（分けて読み込んだ場合のエラー表示用）。
+    """
+    import pandas as pd
+    
+    missing_columns = [column for column in IMPORT_COLUMNS if column not in df.columns]
+    if missing_columns:
+        errors = pd.DataFrame({"行": [None], "エラー": [f"列が不足しています: {', '.join(missing_columns)}"]})
+        return [], errors
+    
+    if IMPORT_TEMPLATE_COLUMN not in df.columns:
+        df = df.assign(**{IMPORT_TEMPLATE_COLUMN: ""})
+    df = df[list(IMPORT_COLUMNS) + [IMPORT_TEMPLATE_COLUMN]].reset_index(drop=True)
+    errors = pd.Series([""] * len(df), index=df.index)
+    
+    def add_error(mask, message):
+        errors[mask] = errors[mask] + message + " / "
+    
+    # 必須項目と選択肢の確認
+    for column, options in IMPORT_COLUMNS.items():
+        if column not in IMPORT_OPTIONAL_COLUMNS:
+            add_error(df[column] == "", f"{column}が空です")
+        if options is not None:
+            add_error((df[column] != "") & ~df[column].isin(options), f"{column}が選択肢にありません")
+    templates = df[IMPORT_TEMPLATE_COLUMN]
+    add_error((templates != "") & ~templates.isin(list(DESCRIPTION_TEMPLATES)), "テンプレートが登録されていません")
+    
+    # 数値・日付の確認（数値は整数に変換するので、小数は切り捨てずにエラーにする）
+    salary = pd.to_numeric(df["報酬"], errors="coerce")
+    add_error((df["報酬"] != "") & (salary.isna() | (salary < 0) | (salary % 1 != 0)), "報酬は0以上の整数で入力してください")
+    hours = pd.to_numeric(df["勤務時間"], errors="coerce")
+    add_error((df["勤務時間"] != "") & (hours.isna() | (hours < 0) | (hours % 1 != 0)), "勤務時間は0以上の整数で入力してください")
+    capacity = pd.to_numeric(df["募集人数"], errors="coerce")
+    add_error((df["募集人数"] != "") & (capacity.isna() | (capacity < 1) | (capacity % 1 != 0)), "募集人数は1以上の整数で入力してください")
+    deadline = pd.to_datetime(df["応募締切"], errors="coerce")
+    add_error((df["応募締切"] != "") & deadline.isna(), "応募締切の日付が不正です")
+    start_date = pd.to_datetime(df["開始予定日"], errors="coerce")
+    add_error((df["開始予定日"] != "") & start_date.isna(), "開始予定日の日付が不正です")
+    
+    valid = errors == ""
+    error_rows = pd.DataFrame({
+        # ファイル上の行番号（ヘッダー行を1行目とする）
+        "行": df.index[(~valid).to_numpy()] + first_row,
+        "エラー": errors[~valid].str.rstrip(" /"),
+    })
+    
+    # フォーム入力と同じ形式に列単位で整形してから、1回の走査で生成する
+    df = df[valid]
+    salary_text = "時給" + salary[valid].astype(int).astype(str) + "円"
+    hours_text = "週" + hours[valid].astype(int).astype(str) + "時間"
+    capacity_text = capacity[valid].astype(int).astype(str)
+    deadline_text = deadline[valid].dt.strftime("%Y-%m-%d")
+    start_date_text = start_date[valid].dt.strftime("%Y-%m-%d")
+    
+    infos = [
+        generate_intern_info(*args)
+        for args in zip(
+            df["企業名"], df["業界"], df["形式"], df["勤務地"], df["最寄り駅"], df["期間"],
+            df["職種"], df["募集対象"], salary_text, df["交通費"], df["開始時間"], df["終了時間"],
+            df["勤務日数"], hours_text, df["歓迎スキル"], df["必須スキル"], df["選考フロー"],
+            deadline_text, start_date_text, capacity_text, df[IMPORT_TEMPLATE_COLUMN]
+        )
+    ]
+    return infos, error_rows
@@ -0,0 +1,197 @@
+"""外部API（Google Sheets / Notion）の呼び出しの計測
+
+呼び出しごとの所要時間・回数・エラー数・再試行数を、API（backend）と操作（operation）ごとに集計する。
+集計はプロセス全体で共有され、管理者向けの画面表示とPrometheusのテキスト形式での出力に使う。
+"""
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 所要時間のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+_lock = threading.Lock()
+# (backend, operation): {"count", "errors", "retries", "seconds", "max_seconds", "buckets"}
+_stats = {}
+_server = None
+
+def _entry(backend, operation):
+    key = (backend, operation)
+    if key not in _stats:
+        _stats[key] = {
+            "count": 0,
+            "errors": 0,
+            "retries": 0,
+            "seconds": 0.0,
+            "max_seconds": 0.0,
+            "buckets": [0] * len(LATENCY_BUCKETS),
+        }
+    return _stats[key]
+
+def record(backend, operation, seconds, error=False):
+    """API呼び出し1回分の結果を記録する関数"""
+    with _lock:
+        entry = _entry(backend, operation)
+        entry["count"] += 1
+        entry["errors"] += 1 if error else 0
+        entry["seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                entry["buckets"][i] += 1
+
+def record_retry(backend, operation):
+    """API呼び出しを再試行したことを記録する関数"""
+    with _lock:
+        _entry(backend, operation)["retries"] += 1
+
+@contextmanager
+def timed(backend, operation):
+    """ブロック内のAPI呼び出しの所要時間を計測して記録する（例外が出た場合はエラーとして記録）"""
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        record(backend, operation, time.perf_counter() - start, error=True)
+        raise
+    record(backend, operation, time.perf_counter() - start)
+
+def snapshot():
+    """集計結果を表示用の辞書のリストで返す関数"""
+    with _lock:
+        items = sorted(_stats.items())
+        return [
+            {
+                "API": backend,
+                "操作": operation,
+                "回数": entry["count"],
+                "エラー": entry["errors"],
+                "再試行": entry["retries"],
+                "平均(秒)": round(entry["seconds"] / entry["count"], 3) if entry["count"] else 0.0,
+                "最大(秒)": round(entry["max_seconds"], 3),
+                "合計(秒)": round(entry["seconds"], 3),
+            }
+            for (backend, operation), entry in items
+        ]
+
+def reset():
+    """集計結果を消去する関数"""
+    with _lock:
+        _stats.clear()
+
+def to_prometheus():
+    """集計結果をPrometheusのテキスト形式で返す関数"""
+    lines = [
+        "# HELP intern_api_requests_total Number of external API requests.",
+        "# TYPE intern_api_requests_total counter",
+    ]
+    with _lock:
+        items = sorted((key, dict(entry, buckets=list(entry["buckets"]))) for key, entry in _stats.items())
+
+    def labels(backend, operation, **extra):
+        pairs = {"backend": backend, "operation": operation, **extra}
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs.items()) + "}"
+
+    for (backend, operation), entry in items:
+        lines.append(f"intern_api_requests_total{labels(backend, operation)} {entry['count']}")
+    lines += [
+        "# HELP intern_api_errors_total Number of external API requests that raised an error.",
+        "# TYPE intern_api_errors_total counter",
+    ]
+    for (backend, operation), entry in items:
+        lines.append(f"intern_api_errors_total{labels(backend, operation)} {entry['errors']}")
+    lines += [
+        "# HELP intern_api_retries_total Number of retried external API requests.",
+        "# TYPE intern_api_retries_total counter",
+    ]
+    for (backend, operation), entry in items:
+        lines.append(f"intern_api_retries_total{labels(backend, operation)} {entry['retries']}")
+    lines += [
+        "# HELP intern_api_request_duration_seconds Duration of external API requests.",
+        "# TYPE intern_api_request_duration_seconds histogram",
+    ]
+    for (backend, operation), entry in items:
+        for bound, bucket_count in zip(LATENCY_BUCKETS, entry["buckets"]):
+            lines.append(
+                f"intern_api_request_duration_seconds_bucket{labels(backend, operation, le=bound)} {bucket_count}"
+            )
+        lines.append(
+            f"intern_api_request_duration_seconds_bucket{labels(backend, operation, le='+Inf')} {entry['count']}"
+        )
+        lines.append(f"intern_api_request_duration_seconds_sum{labels(backend, operation)} {entry['seconds']:.6f}")
+        lines.append(f"intern_api_request_duration_seconds_count{labels(backend, operation)} {entry['count']}")
+    return "\n".join(lines) + "\n"
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """/metrics でPrometheusのテキスト形式の集計結果を返すハンドラー"""
+
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = to_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_server(port, host="127.0.0.1"):
+    """Prometheusから取得できるように集計結果をHTTPで公開する関数（プロセスごとに1回だけ起動）"""
+    global _server
+    with _lock:
+        if _server is None:
+            _server = ThreadingHTTPServer((host, port), MetricsHandler)
+            threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server
+
+def start_server_from_env():
+    """環境変数 METRICS_PORT が設定されていれば集計結果をHTTPで公開する関数"""
+    port = os.getenv("METRICS_PORT")
+    if port:
+        start_server(int(port), os.getenv("METRICS_HOST", "127.0.0.1"))
+
+def get_admin_token():
+    """管理者トークンを環境変数またはStreamlitのシークレットから取得する関数"""
+    import streamlit as st
+    
+    token = os.getenv("ADMIN_TOKEN")
+    if token:
+        return token
+    try:
+        return st.secrets.get("ADMIN_TOKEN")
+    except Exception:
+        return None
+
+def show_admin_panel():
+    """管理者向けの計測パネルをサイドバーに表示する関数（管理者トークンが設定されている場合のみ）"""
+    import streamlit as st
+    
+    admin_token = get_admin_token()
+    if not admin_token:
+        return
+    with st.sidebar.expander("管理者メニュー"):
+        entered = st.text_input("管理者トークン", type="password", key="admin_token")
+        if not entered or not hmac.compare_digest(entered.encode("utf-8"), str(admin_token).encode("utf-8")):
+            return
+        st.markdown("###### API呼び出しの計測")
+        rows = snapshot()
+        if rows:
+            st.dataframe(rows, hide_index=True)
+        else:
+            st.caption("まだAPIの呼び出しはありません")
+        st.download_button(
+            "Prometheus形式でダウンロード",
+            to_prometheus(),
+            file_name="metrics.txt",
+            mime="text/plain",
+            key="metrics_download"
+        )
+        if st.button("計測結果をリセット", key="metrics_reset"):
+            reset()
@@ -0,0 +1,119 @@
+"""似ているインターン情報（ほぼ重複）の検出
+
+同じ企業名・職種のインターン情報どうしで、項目の値の文字3-gram（シングル）から作った
+MinHash署名を比べ、必須スキルの言い回しだけが違うような「ほぼ同じ」インターン情報を見つける。
+署名はローカル索引に保存し、LSH（署名をいくつかの帯に分けたハッシュ）で比べる相手を絞るので、
+シートを読み込んだり保存済みの全件と比べたりせずに済む。
+
+説明は項目の値とテンプレートの定型文から作られるので、定型文で似て見えないように
+説明そのものではなく項目の値（＝説明の定型文以外の部分）を比べる。
+"""
+import hashlib
+import os
+import random
+import unicodedata
+import zlib
+
+import posting
+import posting_index
+
+# シングル（比べる単位）の文字数
+SHINGLE_SIZE = 3
+# MinHash署名の長さ（ハッシュ関数の数）。似ている度合いの推定の誤差は ±0.03 程度
+MINHASH_PERMUTATIONS = 128
+# LSHの帯の数（1つの帯は MINHASH_PERMUTATIONS / LSH_BANDS 個の値）
+# 32帯 × 4個では、似ている度合い0.7以上のものが候補から漏れることはまずない
+LSH_BANDS = 32
+# この値以上を「ほぼ重複」とみなす（署名が一致する割合。0〜1）
+NEAR_DUPLICATE_THRESHOLD = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.8"))
+
+# 比べる項目（キーの企業名・職種、そこから作るインターン名、テンプレートで作る説明を除く）
+# 開始予定日もキーの一部で、同じなら同じインターン情報の更新になるので比べない
+SIMILARITY_FIELDS = [
+    name for name in posting.FIELDS if name not in ("インターン名", "企業名", "職種", "開始予定日", "説明")
+]
+
+# ハッシュ関数 ((a * x + b) mod 2^64) >> 32 の係数。署名を保存して比べるので、どのプロセスでも同じ値にする
+_random = random.Random(20240601)
+_COEFFICIENTS = [(_random.getrandbits(64) | 1, _random.getrandbits(64)) for _ in range(MINHASH_PERMUTATIONS)]
+
+def block_key(info):
+    """比べる相手を絞るキー（企業名・職種）を返す関数"""
+    return f"{str(info['企業名']).strip()}\t{str(info['職種']).strip()}"
+
+def shingles(info):
+    """比べる項目の値を正規化（全角・半角、大文字・小文字、空白）し、文字3-gramの集合を返す関数"""
+    text = unicodedata.normalize("NFKC", "\n".join(str(info[name]) for name in SIMILARITY_FIELDS)).lower()
+    text = "".join(text.split())
+    return {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+
+def signature(info):
+    """インターン情報のMinHash署名（MINHASH_PERMUTATIONS 個の値の配列）を返す関数"""
+    import numpy as np
+
+    values = np.fromiter(
+        (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles(info)), dtype=np.uint64
+    )
+    a, b = (np.array(column, dtype=np.uint64) for column in zip(*_COEFFICIENTS))
+    # 2^64 での桁あふれはそのまま剰余になる
+    hashed = (a[:, None] * values[None, :] + b[:, None]) >> np.uint64(32)
+    return hashed.min(axis=1)
+
+def band_hashes(sig):
+    """署名を LSH_BANDS 個の帯に分け、帯ごとのハッシュ値を返す関数（1つでも一致すれば比べる候補）"""
+    return [
+        int.from_bytes(hashlib.blake2b(band.tobytes(), digest_size=8).digest(), "big", signed=True)
+        for band in sig.reshape(LSH_BANDS, -1)
+    ]
+
+def record_postings(infos):
+    """インターン情報の署名を索引に記録する関数（保存したときに呼び出す）"""
+    entries = []
+    for info in infos:
+        sig = signature(info)
+        entries.append((
+            posting_index.posting_key(info), block_key(info), info["インターン名"], info["開始予定日"],
+            sig.astype("<u8").tobytes(), band_hashes(sig)
+        ))
+    posting_index.record_signatures(entries)
+
+def find_near_duplicates(info, threshold=None, limit=5):
+    """保存済みのインターン情報から、info とほぼ同じものを探す関数
+
+    同じキー（企業名・職種・開始予定日）のものは同じインターン情報の更新なので含めない。
+    戻り値は (似ている度合い, インターン名, 開始予定日) のリスト（似ている順に limit 件まで）。
+    """
+    return find_near_duplicates_many([info], threshold, limit)[0]
+
+def find_near_duplicates_many(infos, threshold=None, limit=5):
+    """複数のインターン情報について find_near_duplicates をまとめて行う関数（索引への接続は1回だけ）
+
+    戻り値は infos と同じ順序の、find_near_duplicates の結果のリスト。
+    """
+    import numpy as np
+
+    threshold = NEAR_DUPLICATE_THRESHOLD if threshold is None else threshold
+    infos = list(infos)
+    signatures = [signature(info) for info in infos]
+    candidates = posting_index.lookup_signature_candidates_many(
+        [(block_key(info), band_hashes(sig)) for info, sig in zip(infos, signatures)]
+    )
+    results = []
+    for info, sig, rows in zip(infos, signatures, candidates):
+        key = posting_index.posting_key(info)
+        matches = []
+        for other_key, intern_name, start_date, other_signature in rows:
+            if other_key == key:
+                continue
+            similarity = float(np.mean(np.frombuffer(other_signature, dtype="<u8") == sig))
+            if similarity >= threshold:
+                matches.append((similarity, intern_name, start_date))
+        results.append(sorted(matches, reverse=True)[:limit])
+    return results
+
+def describe(matches):
+    """find_near_duplicates の結果を1行の文章にする関数"""
+    return "、".join(
+        f"{intern_name}（開始予定日: {start_date}、類似度 {similarity:.0%}）"
+        for similarity, intern_name, start_date in matches
+    )
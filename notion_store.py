@@ -0,0 +1,342 @@
+"""Notionデータベースへのインターン情報の保存
+
+Notion APIの流量制限に合わせたレート制限と再試行を行い、
+ローカル索引を使って同じ内容の再送信をスキップする。
+送信するプロパティは、キャッシュしたデータベースの定義（型と選択肢）で送信前に確認・変換し、
+定義に合わないものはAPIを呼ばずにエラーにする。
+"""
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from time import monotonic
+
+import streamlit as st
+
+import posting
+import posting_index
+from ratelimit import call_with_retry, create_token_bucket, get_status
+
+def is_configured():
+    """Notionのトークンとデータベースが設定されているかを返す関数"""
+    return bool(os.getenv("NOTION_TOKEN") and os.getenv("NOTION_DATABASE_ID"))
+
+# Notionクライアントの初期化（送信するときに初めて読み込む）
+@st.cache_resource
+def get_notion_client(token):
+    """Notionクライアントを取得する関数（トークンごとに1つだけ作成）
+
+    再試行は call_notion_with_retry でレート制限・計測と合わせて行うので、クライアント自身の再試行は止める。
+    """
+    from notion_client import Client
+    return Client(auth=token, retry=False)
+
+# Notion APIの流量制限（平均3リクエスト/秒）に合わせた送信レート
+NOTION_REQUESTS_PER_SECOND = float(os.getenv("NOTION_REQUESTS_PER_SECOND", "3"))
+# 一括送信の同時実行数
+NOTION_MAX_WORKERS = 4
+# 429（Too Many Requests）や一時的なエラーを再試行する回数
+NOTION_MAX_RETRIES = 5
+
+@st.cache_resource
+def get_notion_rate_limiter(rate):
+    """Notion API用のレート制限器を取得する関数（全セッションで共有）"""
+    return create_token_bucket(rate)
+
+# 5xxで再試行すると二重に作成・追加されるおそれがある操作（429だけを再試行する）
+NOTION_NON_IDEMPOTENT_OPERATIONS = {"pages.create", "blocks.children.append"}
+
+def call_notion_with_retry(method, rate_limiter, operation, **kwargs):
+    """レート制限を守ってNotion APIを呼び出し、429や5xxの場合は再試行する関数
+    
+    ページの作成などの冪等でない操作は429の場合だけ再試行する。
+    呼び出しごとの所要時間・エラー・再試行は operation（例: pages.create）ごとに記録する。
+    """
+    return call_with_retry(
+        lambda: method(**kwargs), rate_limiter, "notion", operation, NOTION_MAX_RETRIES,
+        retry_server_errors=operation not in NOTION_NON_IDEMPOTENT_OPERATIONS
+    )
+
+# データベースの定義（プロパティの型と選択肢）のキャッシュ有効期間（秒）
+NOTION_SCHEMA_TTL_SECONDS = 600
+# データベースにない選択肢を送信してよいか（1 にするとNotionが選択肢を追加する。既定では送信前にエラーにする）
+NOTION_ALLOW_NEW_OPTIONS = os.getenv("NOTION_ALLOW_NEW_OPTIONS", "0") == "1"
+# Notionのテキスト1つあたりの最大文字数（超える分は複数のテキストに分ける）
+NOTION_TEXT_LIMIT = 2000
+# 選択肢の名前の最大文字数
+NOTION_OPTION_LIMIT = 100
+
+@st.cache_resource
+def get_notion_schema_cache():
+    """データベースの定義をプロセス全体（全セッション）で共有するキャッシュを取得する関数"""
+    # schemas のキー: データベースID / 値: (取得した時刻, {プロパティ名: (型, 選択肢の集合または None)})
+    # fetch_locks: 同じデータベースの定義を複数のスレッドが同時に取得しないためのロック
+    return {"lock": threading.Lock(), "schemas": {}, "fetch_locks": {}}
+
+def invalidate_database_schema(database_id):
+    """データベースの定義のキャッシュを破棄する関数"""
+    cache = get_notion_schema_cache()
+    with cache["lock"]:
+        cache["schemas"].pop(database_id, None)
+
+def parse_database_schema(properties):
+    """プロパティの定義から {プロパティ名: (型, 選択肢の集合または None)} を作る関数"""
+    schema = {}
+    for name, definition in properties.items():
+        kind = definition.get("type")
+        options = None
+        if kind in ("select", "multi_select"):
+            options = {option["name"] for option in definition.get(kind, {}).get("options", [])}
+        schema[name] = (kind, options)
+    return schema
+
+def get_database_schema(notion, database_id, rate_limiter, max_age=NOTION_SCHEMA_TTL_SECONDS):
+    """データベースのプロパティの定義を返す関数（max_age 秒以内に取得したものがあればAPIは呼ばない）
+
+    Notion API 2025-09-03 以降はプロパティをデータベースではなくデータソースが持つので、
+    データベースにプロパティがなければ最初のデータソースの定義を取得する。
+    """
+    cache = get_notion_schema_cache()
+    with cache["lock"]:
+        fetch_lock = cache["fetch_locks"].setdefault(database_id, threading.Lock())
+    with fetch_lock:
+        with cache["lock"]:
+            entry = cache["schemas"].get(database_id)
+        if entry is not None and monotonic() - entry[0] < max_age:
+            return entry[1]
+
+        database = call_notion_with_retry(
+            notion.databases.retrieve, rate_limiter, "databases.retrieve", database_id=database_id
+        )
+        properties = database.get("properties")
+        if properties is None:
+            data_sources = database.get("data_sources") or []
+            if not data_sources:
+                raise RuntimeError("Notionのデータベースにデータソースがありません")
+            properties = call_notion_with_retry(
+                notion.data_sources.retrieve,
+                rate_limiter,
+                "data_sources.retrieve",
+                data_source_id=data_sources[0]["id"]
+            )["properties"]
+        schema = parse_database_schema(properties)
+        with cache["lock"]:
+            cache["schemas"][database_id] = (monotonic(), schema)
+        return schema
+
+def to_rich_text(value):
+    """値をNotionのテキストのリストに変換する関数（NOTION_TEXT_LIMIT 文字ごとに分ける）"""
+    text = "" if value is None else str(value)
+    return [
+        {"text": {"content": text[i:i + NOTION_TEXT_LIMIT]}}
+        for i in range(0, len(text), NOTION_TEXT_LIMIT)
+    ]
+
+def to_option(value, options):
+    """値を選択肢に変換する関数（空欄は None。データベースにない選択肢は ValueError）"""
+    name = "" if value is None else str(value).strip()
+    if not name:
+        return None
+    if "," in name:
+        raise ValueError(f"選択肢にカンマ（,）は使えません: {name}")
+    if len(name) > NOTION_OPTION_LIMIT:
+        raise ValueError(f"選択肢は{NOTION_OPTION_LIMIT}文字以内にしてください: {name}")
+    if options is not None and name not in options and not NOTION_ALLOW_NEW_OPTIONS:
+        raise ValueError(f"「{name}」はデータベースの選択肢にありません")
+    return {"name": name}
+
+def to_number(value):
+    """値を数値に変換する関数（全角数字・桁区切り・末尾の「名」「人」を許す。空欄は None）"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return value
+    text = unicodedata.normalize("NFKC", "" if value is None else str(value)).strip().replace(",", "")
+    if not text:
+        return None
+    match = re.fullmatch(r"([-+]?\d+(?:\.\d+)?)\s*[名人]?", text)
+    if not match:
+        raise ValueError(f"数値として読み込めません: {value}")
+    number = float(match.group(1))
+    return int(number) if number.is_integer() else number
+
+def to_date(value):
+    """値をISO形式（YYYY-MM-DD）の日付に変換する関数（2025/7/1 のような形式も許す。空欄は None）"""
+    if isinstance(value, date):
+        return value.isoformat()
+    text = unicodedata.normalize("NFKC", "" if value is None else str(value)).strip()
+    if not text:
+        return None
+    match = re.fullmatch(r"(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})", text)
+    try:
+        return date(*map(int, match.groups())).isoformat()
+    except (AttributeError, ValueError):
+        raise ValueError(f"日付（YYYY-MM-DD）として読み込めません: {value}") from None
+
+def to_property(kind, value, options=None):
+    """値をNotionのプロパティに変換する関数（変換できない場合は ValueError）"""
+    if kind == "title" or kind == "rich_text":
+        return {kind: to_rich_text(value)}
+    if kind == "select":
+        return {"select": to_option(value, options)}
+    if kind == "number":
+        return {"number": to_number(value)}
+    if kind == "date":
+        start = to_date(value)
+        return {"date": {"start": start} if start else None}
+    raise ValueError(f"{kind} 型のプロパティには保存できません")
+
+def build_notion_properties(info, schema):
+    """レコードからNotionページのプロパティを作り、データベースの定義で確認・変換する関数
+
+    項目の型はレコードの定義（posting.SCHEMA）に従う。データベースにプロパティがない・型が違う・
+    値を変換できないものは、すべてエラーとして返す。戻り値は (プロパティ, エラー内容のリスト)。
+    """
+    properties, errors = {}, []
+    for (name, kind), value in zip(posting.SCHEMA, info):
+        if kind is None:
+            continue
+        if name not in schema:
+            errors.append(f"{name}: データベースにプロパティがありません")
+            continue
+        database_kind, options = schema[name]
+        if database_kind != kind:
+            errors.append(f"{name}: データベースのプロパティの型が {database_kind} です（{kind} が必要）")
+            continue
+        try:
+            properties[name] = to_property(kind, value, options)
+        except ValueError as e:
+            errors.append(f"{name}: {str(e)}")
+    return properties, errors
+
+def description_blocks(info):
+    """ページの本文（説明の段落）のブロックを作る関数（長い説明はプロパティと同じくテキストを分ける）"""
+    return [
+        {
+            "object": "block",
+            "type": "paragraph",
+            "paragraph": {
+                "rich_text": [dict(text, type="text") for text in to_rich_text(info["説明"])]
+            }
+        }
+    ]
+
+def block_text(block):
+    """ブロックの種類と文字列を返す関数（本文が変わったかどうかの比較に使う）"""
+    kind = block.get("type")
+    texts = block.get(kind, {}).get("rich_text", [])
+    return kind, "".join(text.get("plain_text") or text.get("text", {}).get("content", "") for text in texts)
+
+def replace_page_body(notion, page_id, children, rate_limiter):
+    """作成済みのページの本文を children に置き換える関数（本文が同じ場合は書き換えない）"""
+    blocks = []
+    cursor = None
+    while True:
+        kwargs = {"block_id": page_id}
+        if cursor:
+            kwargs["start_cursor"] = cursor
+        response = call_notion_with_retry(notion.blocks.children.list, rate_limiter, "blocks.children.list", **kwargs)
+        blocks += response.get("results", [])
+        if not response.get("has_more"):
+            break
+        cursor = response["next_cursor"]
+    if [block_text(block) for block in blocks] == [block_text(block) for block in children]:
+        return
+
+    # 新しい本文を先に追加してから古いブロックを削除する（途中で失敗しても本文が空にならない）
+    call_notion_with_retry(
+        notion.blocks.children.append, rate_limiter, "blocks.children.append", block_id=page_id, children=children
+    )
+    for block in blocks:
+        call_notion_with_retry(notion.blocks.delete, rate_limiter, "blocks.delete", block_id=block["id"])
+
+# 同じインターン情報のページを同時に作成しないためのロックの数（キーのハッシュ値で振り分ける）
+NOTION_PAGE_LOCK_COUNT = 64
+
+@st.cache_resource
+def get_notion_page_locks():
+    """ページの作成・更新に使うロックを取得する関数（全セッション・全スレッドで共有）"""
+    return [threading.Lock() for _ in range(NOTION_PAGE_LOCK_COUNT)]
+
+def notion_page_lock(database_id, key):
+    """インターン情報のキーに対応するロックを返す関数
+    
+    索引の照合からページの作成・索引への記録までをこのロックの中で行い、
+    同じインターン情報を同時に送信しても両方が新しいページとして作成されないようにする。
+    """
+    locks = get_notion_page_locks()
+    return locks[hash((database_id, key)) % len(locks)]
+
+def create_notion_page(info, rate_limiter=None):
+    """Notionにページを作成する関数
+    
+    ローカル索引に同じ内容が記録されていればAPIを呼ばずにスキップし、
+    内容が変わっていれば作成済みのページのプロパティと本文（説明）を更新する。
+    内容のハッシュは、プロパティと本文の両方を書き込めた場合だけ記録する。
+    索引の照合から記録までは同じキーごとのロックの中で行う。
+    データベースの定義に合わない場合は、ページの作成・更新のAPIを呼ばずに失敗を返す。
+    """
+    database_id = os.getenv("NOTION_DATABASE_ID")
+    try:
+        key = posting_index.posting_key(info)
+        digest = posting_index.content_hash(info)
+        with notion_page_lock(database_id, key):
+            known_page = posting_index.lookup_notion_page(database_id, key)
+            if known_page and known_page[2] == digest:
+                return True, known_page[1]
+            
+            notion = get_notion_client(os.getenv("NOTION_TOKEN"))
+            rate_limiter = rate_limiter or get_notion_rate_limiter(NOTION_REQUESTS_PER_SECOND)
+
+            # ページのプロパティを設定し、データベースの定義で確認する
+            info = posting.from_mapping(info)
+            properties, errors = build_notion_properties(
+                info, get_database_schema(notion, database_id, rate_limiter)
+            )
+            if errors:
+                return False, "Notionのデータベースの定義に合いません: " + " / ".join(errors)
+
+            # ページのコンテンツを設定
+            children = description_blocks(info)
+
+            if known_page:
+                # 作成済みのページのプロパティと本文を更新
+                new_page = call_notion_with_retry(
+                    notion.pages.update,
+                    rate_limiter,
+                    "pages.update",
+                    page_id=known_page[0],
+                    properties=properties
+                )
+                replace_page_body(notion, known_page[0], children, rate_limiter)
+            else:
+                # Notionにページを作成
+                new_page = call_notion_with_retry(
+                    notion.pages.create,
+                    rate_limiter,
+                    "pages.create",
+                    parent={"database_id": database_id},
+                    properties=properties,
+                    children=children
+                )
+            
+            posting_index.record_notion_page(database_id, key, new_page["id"], new_page["url"], digest)
+            return True, new_page["url"]
+    except Exception as e:
+        if get_status(e) == 400:
+            # データベースの定義が変わった可能性があるので、次の送信では取得し直す
+            invalidate_database_schema(database_id)
+        return False, str(e)
+
+def create_notion_pages(infos, max_workers=NOTION_MAX_WORKERS, requests_per_second=NOTION_REQUESTS_PER_SECOND):
+    """複数のインターン情報をNotionに並行して送信する関数
+    
+    送信レートは requests_per_second 以下に抑える。
+    戻り値は infos と同じ順序の (成功したか, ページURLまたはエラー内容) のリスト。
+    """
+    infos = list(infos)
+    if not infos:
+        return []
+    rate_limiter = get_notion_rate_limiter(requests_per_second)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="notion") as executor:
+        return list(executor.map(lambda info: create_notion_page(info, rate_limiter), infos))
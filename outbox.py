@@ -0,0 +1,236 @@
+"""送信待ちのインターン情報を保存するローカルの送信箱（アウトボックス）
+
+生成したインターン情報はまずここに書き込み、スプレッドシートやNotionへの送信は
+フラッシャーがまとめて行う。送信に失敗したものは指数バックオフで再試行されるまで残る。
+OUTBOX_MAX_ATTEMPTS 回失敗したものは送信できなかったもの（failed_at に時刻）として再試行をやめ、
+画面から送信し直すか破棄するまで残す。
+"""
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+import posting
+import posting_index
+
+OUTBOX_PATH = os.getenv(
+    "OUTBOX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "outbox.sqlite3")
+)
+
+# 再試行の間隔（秒）。失敗するたびに倍になり、RETRY_MAX_SECONDS で頭打ちになる
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 600
+# この回数だけ失敗したら再試行をやめる（既定の20回で、最初の送信から2時間ほど再試行する）
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "20"))
+# 送信中のまま残った（プロセスが落ちた等）ものを再び送信対象にするまでの時間（秒）
+LEASE_SECONDS = 300
+
+SINK_SHEETS = "sheets"
+SINK_NOTION = "notion"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    sink TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    claimed_until REAL NOT NULL DEFAULT 0,
+    last_error TEXT NOT NULL DEFAULT '',
+    failed_at REAL,
+    posting_key TEXT
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (sink, next_attempt_at);
+"""
+# 以前の送信箱に追加する列
+MIGRATION_COLUMNS = {"failed_at": "REAL", "posting_key": "TEXT"}
+
+_schema_lock = threading.Lock()
+# スキーマを準備済みのデータベースのパス
+_schema_ready = set()
+
+def prepare_schema():
+    """送信箱のテーブルを準備する関数（プロセスごとに最初の1回だけ実行する）"""
+    if OUTBOX_PATH in _schema_ready:
+        return
+    with _schema_lock:
+        if OUTBOX_PATH in _schema_ready:
+            return
+        os.makedirs(os.path.dirname(OUTBOX_PATH), exist_ok=True)
+        with closing(sqlite3.connect(OUTBOX_PATH, timeout=30, isolation_level=None)) as conn:
+            # WALはデータベースファイルに記録されるので、以降の接続でも有効
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            # 列が足りない以前の送信箱には列を追加する
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(outbox)")}
+            for column, column_type in MIGRATION_COLUMNS.items():
+                if column in columns:
+                    continue
+                try:
+                    conn.execute(f"ALTER TABLE outbox ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError:
+                    # 他のプロセスが先に追加した
+                    pass
+            conn.execute("CREATE INDEX IF NOT EXISTS outbox_posting_key ON outbox (sink, posting_key)")
+        _schema_ready.add(OUTBOX_PATH)
+
+def connect():
+    """送信箱のデータベースに接続する関数（スレッドごと・呼び出しごとに接続する）"""
+    prepare_schema()
+    return sqlite3.connect(OUTBOX_PATH, timeout=30, isolation_level=None)
+
+def enqueue(infos, sink):
+    """インターン情報を送信箱に書き込み、エントリーIDのリストを返す関数"""
+    now = time.time()
+    ids = []
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for info in infos:
+            # キーの項目がすべて空のもの（保存時に失敗するもの）はまとめない
+            key = posting_index.posting_key(info)
+            cursor = conn.execute(
+                "INSERT INTO outbox (sink, payload, created_at, next_attempt_at, posting_key) VALUES (?, ?, ?, ?, ?)",
+                (sink, json.dumps(info, ensure_ascii=False, default=str), now, now, key if key.strip() else None)
+            )
+            ids.append(cursor.lastrowid)
+        conn.execute("COMMIT")
+    return ids
+
+def claim(sink, limit, ids=None):
+    """送信する順番が来たエントリーを取り出し、送信中にする関数
+
+    ids を指定した場合はその中から、再試行待ちかどうかに関わらず取り出す。
+    同じインターン情報（キーが同じもの）のエントリーが送信待ちに複数ある場合は、まとめて取り出して
+    最も新しいものだけを送信する（古いものを後から送信して内容が戻ったり、同時に送信して二重に保存されたりしないように）。
+    戻り値は (エントリーID, インターン情報のレコード, 同じ送信で済ませる古いエントリーIDのリスト) のリスト。
+    他のスレッドが送信中のものと、送信できなかったもの（再試行をやめたもの）は含まない。
+    """
+    now = time.time()
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if ids is None:
+            rows = conn.execute(
+                "SELECT id, payload, posting_key FROM outbox"
+                " WHERE sink = ? AND next_attempt_at <= ? AND claimed_until <= ? AND failed_at IS NULL"
+                " ORDER BY id LIMIT ?",
+                (sink, now, now, limit)
+            ).fetchall()
+        else:
+            ids = list(ids)[:limit]
+            rows = conn.execute(
+                "SELECT id, payload, posting_key FROM outbox"
+                f" WHERE sink = ? AND claimed_until <= ? AND failed_at IS NULL AND id IN ({','.join('?' * len(ids))})"
+                " ORDER BY id",
+                [sink, now, *ids]
+            ).fetchall() if ids else []
+        keys = list({key for _, _, key in rows if key is not None})
+        if keys:
+            # 同じキーの他の送信待ちのエントリーも、再試行待ちかどうかに関わらず一緒に取り出す
+            rows += conn.execute(
+                "SELECT id, payload, posting_key FROM outbox"
+                f" WHERE sink = ? AND claimed_until <= ? AND failed_at IS NULL AND posting_key IN ({','.join('?' * len(keys))})"
+                f" AND id NOT IN ({','.join('?' * len(rows))})",
+                [sink, now, *keys, *(entry_id for entry_id, _, _ in rows)]
+            ).fetchall()
+        conn.executemany(
+            "UPDATE outbox SET claimed_until = ? WHERE id = ?",
+            [(now + LEASE_SECONDS, entry_id) for entry_id, _, _ in rows]
+        )
+        conn.execute("COMMIT")
+    # キーごとに最も新しいエントリーを送信する（キーのない以前のエントリーは1件ずつ送信する）
+    groups = {}
+    for entry_id, payload, key in sorted(rows):
+        groups.setdefault(key if key is not None else ("id", entry_id), []).append((entry_id, payload))
+    entries = []
+    for group in groups.values():
+        entry_id, payload = group[-1]
+        entries.append((entry_id, posting.from_payload(json.loads(payload)), [older_id for older_id, _ in group[:-1]]))
+    return sorted(entries, key=lambda entry: entry[0])
+
+def complete(ids):
+    """送信できたエントリーを送信箱から削除する関数"""
+    with closing(connect()) as conn:
+        conn.executemany("DELETE FROM outbox WHERE id = ?", [(entry_id,) for entry_id in ids])
+
+def retry_later(failures):
+    """送信に失敗したエントリーを再試行待ちに戻す関数（failures: (エントリーID, エラー内容) のリスト）
+
+    OUTBOX_MAX_ATTEMPTS 回目の失敗では再試行待ちに戻さず、送信できなかったものにする。
+    """
+    now = time.time()
+    with closing(connect()) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for entry_id, error in failures:
+            row = conn.execute("SELECT attempts FROM outbox WHERE id = ?", (entry_id,)).fetchone()
+            if row is None:
+                continue
+            attempts = row[0] + 1
+            if attempts >= OUTBOX_MAX_ATTEMPTS:
+                conn.execute(
+                    "UPDATE outbox SET attempts = ?, claimed_until = 0, last_error = ?, failed_at = ? WHERE id = ?",
+                    (attempts, str(error), now, entry_id)
+                )
+                continue
+            # 指数バックオフ（同時に失敗したものが一斉に再送しないようにゆらぎを加える）
+            delay = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1)) * (0.5 + random.random() / 2)
+            conn.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt_at = ?, claimed_until = 0, last_error = ? WHERE id = ?",
+                (attempts, now + delay, str(error), entry_id)
+            )
+        conn.execute("COMMIT")
+
+def pending_ids(sink):
+    """送信待ちのエントリーIDを古い順に返す関数（送信できなかったものは含まない）"""
+    with closing(connect()) as conn:
+        return [row[0] for row in conn.execute(
+            "SELECT id FROM outbox WHERE sink = ? AND failed_at IS NULL ORDER BY id", (sink,)
+        )]
+
+def pending_count(sink):
+    """送信待ちのエントリー数を返す関数（送信できなかったものは含まない）"""
+    with closing(connect()) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE sink = ? AND failed_at IS NULL", (sink,)
+        ).fetchone()[0]
+
+def failed_entries(sink, limit=1000):
+    """送信できなかった（再試行をやめた）エントリーを古い順に返す関数
+
+    戻り値は (エントリーID, インターン情報のレコード, 失敗した回数, 最後のエラー内容) のリスト。
+    """
+    with closing(connect()) as conn:
+        rows = conn.execute(
+            "SELECT id, payload, attempts, last_error FROM outbox"
+            " WHERE sink = ? AND failed_at IS NOT NULL ORDER BY id LIMIT ?",
+            (sink, limit)
+        ).fetchall()
+    return [
+        (entry_id, posting.from_payload(json.loads(payload)), attempts, last_error)
+        for entry_id, payload, attempts, last_error in rows
+    ]
+
+def failed_count(sink):
+    """送信できなかった（再試行をやめた）エントリー数を返す関数"""
+    with closing(connect()) as conn:
+        return conn.execute(
+            "SELECT COUNT(*) FROM outbox WHERE sink = ? AND failed_at IS NOT NULL", (sink,)
+        ).fetchone()[0]
+
+def requeue_failed(sink):
+    """送信できなかったエントリーを、失敗した回数を0に戻して送信待ちに戻す関数（戻した件数を返す）"""
+    with closing(connect()) as conn:
+        return conn.execute(
+            "UPDATE outbox SET attempts = 0, next_attempt_at = ?, failed_at = NULL"
+            " WHERE sink = ? AND failed_at IS NOT NULL",
+            (time.time(), sink)
+        ).rowcount
+
+def discard_failed(sink):
+    """送信できなかったエントリーを送信箱から削除する関数（削除した件数を返す）"""
+    with closing(connect()) as conn:
+        return conn.execute("DELETE FROM outbox WHERE sink = ? AND failed_at IS NOT NULL", (sink,)).rowcount
@@ -0,0 +1,96 @@
+"""送信箱（アウトボックス）から保存先への送信
+
+送信箱に書き込んだインターン情報を、保存先（sinks）ごとに batch_size 件ずつまとめて保存する。
+画面からの今すぐの送信と、バックグラウンドの自動送信スレッドの両方から使う。
+"""
+import threading
+from time import sleep
+
+import streamlit as st
+
+import outbox
+import sinks
+
+# 送信箱を自動で送信する間隔（秒）
+OUTBOX_FLUSH_INTERVAL_SECONDS = 30
+
+def flush_outbox_to_sink(sink, ids=None):
+    """送信箱のインターン情報を sink.batch_size 件までまとめて保存先に保存する関数
+    
+    同じインターン情報の古いエントリーは最も新しいものと一緒に取り出され、同じ結果になる。
+    失敗したものは送信箱に残り、バックオフ後に再試行される。
+    戻り値は {エントリーID: (成功したか, メッセージ)}。
+    """
+    entries = outbox.claim(sink.name, sink.batch_size, ids)
+    if not entries:
+        return {}
+    try:
+        results = sink.save_many([info for _, info, _ in entries])
+    except Exception as e:
+        results = [(False, f"予期せぬエラーが発生しました: {str(e)}")] * len(entries)
+    results_by_id = {}
+    for (entry_id, _, older_ids), result in zip(entries, results):
+        for result_id in [entry_id, *older_ids]:
+            results_by_id[result_id] = result
+    outbox.complete([entry_id for entry_id, (success, _) in results_by_id.items() if success])
+    outbox.retry_later([
+        (entry_id, message) for entry_id, (success, message) in results_by_id.items() if not success
+    ])
+    return results_by_id
+
+def flush_sink_entries(sink, ids):
+    """指定した送信箱のエントリーを今すぐ保存先に保存し、ids と同じ順序の結果を返す関数
+    
+    自動送信が先に取り出したものは、成功したかどうかがまだ分からないので (None, メッセージ) を返す。
+    """
+    results = {}
+    for start in range(0, len(ids), sink.batch_size):
+        results.update(flush_outbox_to_sink(sink, ids[start:start + sink.batch_size]))
+    return [results.get(entry_id, (None, "自動送信で保存中です")) for entry_id in ids]
+
+def flush_outbox_entries(ids_by_sink):
+    """保存先ごとの送信箱のエントリーを、すべての保存先に同時に保存する関数
+    
+    ids_by_sink は {保存先の名前: エントリーIDのリスト}。
+    戻り値は {保存先の名前: エントリーIDと同じ順序の (成功したか, メッセージ) のリスト}。
+    """
+    sink_map = {sink.name: sink for sink in sinks.get_enabled_sinks()}
+    results = sinks.fan_out({
+        name: (lambda sink=sink_map[name], ids=ids: flush_sink_entries(sink, ids))
+        for name, ids in ids_by_sink.items() if name in sink_map and ids
+    })
+    return {
+        name: (
+            [(False, f"予期せぬエラーが発生しました: {str(result)}")] * len(ids_by_sink[name])
+            if isinstance(result, Exception) else result
+        )
+        for name, result in results.items()
+    }
+
+def run_outbox_flusher(sink_names=None):
+    """送信箱を定期的に有効な保存先へ送信し続ける関数（バックグラウンドスレッドで実行）
+    
+    sink_names を指定した場合は、その名前の保存先だけに送信する（None はすべての保存先）。
+    """
+    while True:
+        try:
+            # 保存先ごとに、送信できるものがなくなるまでまとめて送信する
+            def drain(sink):
+                while flush_outbox_to_sink(sink):
+                    pass
+            for name, error in sinks.fan_out({
+                sink.name: (lambda sink=sink: drain(sink))
+                for sink in sinks.get_enabled_sinks() if sink_names is None or sink.name in sink_names
+            }).items():
+                if isinstance(error, Exception):
+                    print(f"送信箱の送信中にエラーが発生しました（{name}）: {str(error)}")
+        except Exception as e:
+            print(f"送信箱の送信中にエラーが発生しました: {str(e)}")
+        sleep(OUTBOX_FLUSH_INTERVAL_SECONDS)
+
+@st.cache_resource
+def start_outbox_flusher(sink_names=None):
+    """送信箱の自動送信スレッドをプロセスごとに1つだけ起動する関数（sink_names は保存先の名前のタプル）"""
+    thread = threading.Thread(target=run_outbox_flusher, args=(sink_names,), name="outbox-flusher", daemon=True)
+    thread.start()
+    return thread
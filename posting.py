@@ -0,0 +1,75 @@
+"""インターン情報の項目定義とレコード
+
+項目の順序と型はここで1回だけ定義し、スプレッドシートの行・CSVの行・Notionのプロパティは
+すべてこの定義から作る。レコードはタプルなので、1件ごとに辞書を持つより大幅に小さい。
+"""
+from collections import namedtuple
+
+# (項目名, Notionのプロパティの型)。この順序がスプレッドシート・CSVの列順になる
+# 説明はNotionではプロパティではなくページ本文になる
+SCHEMA = [
+    ("インターン名", "title"),
+    ("企業名", "rich_text"),
+    ("業界", "select"),
+    ("形式", "select"),
+    ("勤務地", "rich_text"),
+    ("最寄り駅", "rich_text"),
+    ("期間", "select"),
+    ("職種", "select"),
+    ("募集対象", "rich_text"),
+    ("報酬", "rich_text"),
+    ("交通費", "rich_text"),
+    ("勤務可能時間", "rich_text"),
+    ("勤務日数", "rich_text"),
+    ("勤務時間", "rich_text"),
+    ("選考フロー", "rich_text"),
+    ("応募締切", "date"),
+    ("開始予定日", "date"),
+    ("募集人数", "number"),
+    ("必須スキル", "rich_text"),
+    ("歓迎スキル", "rich_text"),
+    ("説明", None),
+]
+
+FIELDS = [name for name, _ in SCHEMA]
+
+class Posting(namedtuple("Posting", FIELDS)):
+    """1件分のインターン情報
+
+    info["企業名"] のように項目名でも参照できるので、テンプレートの format_map にそのまま渡せる。
+    値を変えるときは info._replace(説明=...) で新しいレコードを作る。
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return self._fields
+
+def from_mapping(mapping):
+    """項目名をキーとする辞書などからレコードを作る関数（項目が足りない場合は KeyError）"""
+    if isinstance(mapping, Posting):
+        return mapping
+    return Posting._make([mapping[name] for name in FIELDS])
+
+def from_row(values):
+    """スプレッドシートの1行分の値からレコードを作る関数（末尾の空欄は返ってこないので空文字で補う）"""
+    return Posting._make(list(values[:len(FIELDS)]) + [""] * (len(FIELDS) - len(values)))
+
+def from_payload(payload):
+    """JSONから読み込んだ値（列順のリスト、または以前の形式の辞書）からレコードを作る関数"""
+    if isinstance(payload, list):
+        return Posting._make(payload)
+    return from_mapping(payload)
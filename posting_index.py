@@ -0,0 +1,212 @@
+"""保存済みインターン情報のローカル索引
+
+インターン情報ごとの安定したキー（企業名・職種・開始予定日）から、
+スプレッドシート上の行番号とNotionのページIDを引けるようにする。
+同じ内容の再保存はAPIを呼ばずにスキップし、内容が変わった場合は既知の行・ページを更新する。
+ほぼ重複の検出（near_duplicates.py）に使う署名もここに保存する。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+import posting
+
+INDEX_PATH = os.getenv(
+    "POSTING_INDEX_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "postings.sqlite3")
+)
+
+# キーを構成する項目
+KEY_FIELDS = ["企業名", "職種", "開始予定日"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sheet_rows (
+    spreadsheet_id TEXT NOT NULL,
+    sheet_name TEXT NOT NULL,
+    posting_key TEXT NOT NULL,
+    row_number INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (spreadsheet_id, sheet_name, posting_key)
+);
+-- 分割先が変わったインターン情報を他のシートから探すため
+CREATE INDEX IF NOT EXISTS sheet_rows_posting_key ON sheet_rows (posting_key);
+CREATE TABLE IF NOT EXISTS notion_pages (
+    database_id TEXT NOT NULL,
+    posting_key TEXT NOT NULL,
+    page_id TEXT NOT NULL,
+    page_url TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    updated_at TEXT NOT NULL,
+    PRIMARY KEY (database_id, posting_key)
+);
+CREATE TABLE IF NOT EXISTS posting_signatures (
+    posting_key TEXT PRIMARY KEY,
+    block_key TEXT NOT NULL,
+    intern_name TEXT NOT NULL,
+    start_date TEXT NOT NULL,
+    signature BLOB NOT NULL,
+    updated_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS signature_bands (
+    block_key TEXT NOT NULL,
+    band INTEGER NOT NULL,
+    band_hash INTEGER NOT NULL,
+    posting_key TEXT NOT NULL,
+    PRIMARY KEY (block_key, band, band_hash, posting_key)
+) WITHOUT ROWID;
+"""
+
+_schema_lock = threading.Lock()
+# スキーマを準備済みのデータベースのパス
+_schema_ready = set()
+
+def prepare_schema():
+    """索引のテーブルを準備する関数（プロセスごとに最初の1回だけ実行する）"""
+    if INDEX_PATH in _schema_ready:
+        return
+    with _schema_lock:
+        if INDEX_PATH in _schema_ready:
+            return
+        os.makedirs(os.path.dirname(INDEX_PATH), exist_ok=True)
+        with closing(sqlite3.connect(INDEX_PATH, timeout=30)) as conn:
+            # WALはデータベースファイルに記録されるので、以降の接続でも有効
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+        _schema_ready.add(INDEX_PATH)
+
+def connect():
+    """索引のデータベースに接続する関数（スレッドごと・呼び出しごとに接続する）"""
+    prepare_schema()
+    return sqlite3.connect(INDEX_PATH, timeout=30)
+
+def posting_key(info):
+    """インターン情報の安定したキーを返す関数"""
+    return "\t".join(str(info.get(field, "")).strip() for field in KEY_FIELDS)
+
+def content_hash(info):
+    """インターン情報の内容全体のハッシュ値を返す関数（列順の値から計算する）"""
+    payload = json.dumps(list(posting.from_mapping(info)), ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def lookup_sheet_rows(spreadsheet_id, sheet_name, keys):
+    """キーに対応する保存済みの行を返す関数（戻り値: {キー: (行番号, ハッシュ値)}）"""
+    keys = list(set(keys))
+    found = {}
+    with closing(connect()) as conn:
+        # SQLiteのパラメーター数の上限を超えないように分割する
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                "SELECT posting_key, row_number, content_hash FROM sheet_rows"
+                " WHERE spreadsheet_id = ? AND sheet_name = ?"
+                f" AND posting_key IN ({','.join('?' * len(chunk))})",
+                [spreadsheet_id, sheet_name, *chunk]
+            ).fetchall()
+            found.update({key: (row_number, digest) for key, row_number, digest in rows})
+    return found
+
+def lookup_sheet_locations(keys):
+    """キーが保存されているすべてのシートの行を返す関数（戻り値: {キー: [(スプレッドシートID, シート名, 行番号)]}）"""
+    keys = list(set(keys))
+    found = {}
+    with closing(connect()) as conn:
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = conn.execute(
+                "SELECT posting_key, spreadsheet_id, sheet_name, row_number FROM sheet_rows"
+                f" WHERE posting_key IN ({','.join('?' * len(chunk))})",
+                chunk
+            ).fetchall()
+            for key, spreadsheet_id, sheet_name, row_number in rows:
+                found.setdefault(key, []).append((spreadsheet_id, sheet_name, row_number))
+    return found
+
+def record_sheet_rows(spreadsheet_id, sheet_name, entries):
+    """保存した行を記録する関数（entries: (キー, 行番号, ハッシュ値) のリスト）"""
+    now = datetime.now().isoformat(timespec="seconds")
+    with closing(connect()) as conn, conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO sheet_rows"
+            " (spreadsheet_id, sheet_name, posting_key, row_number, content_hash, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [(spreadsheet_id, sheet_name, key, row_number, digest, now) for key, row_number, digest in entries]
+        )
+
+def forget_sheet_rows(spreadsheet_id, sheet_name, keys):
+    """シート上の位置が分からなくなった行の記録を削除する関数"""
+    with closing(connect()) as conn, conn:
+        conn.executemany(
+            "DELETE FROM sheet_rows WHERE spreadsheet_id = ? AND sheet_name = ? AND posting_key = ?",
+            [(spreadsheet_id, sheet_name, key) for key in keys]
+        )
+
+def lookup_notion_page(database_id, key):
+    """キーに対応する作成済みのNotionページを返す関数（戻り値: (ページID, URL, ハッシュ値) または None）"""
+    with closing(connect()) as conn:
+        return conn.execute(
+            "SELECT page_id, page_url, content_hash FROM notion_pages WHERE database_id = ? AND posting_key = ?",
+            (database_id, key)
+        ).fetchone()
+
+def record_notion_page(database_id, key, page_id, page_url, digest):
+    """作成・更新したNotionページを記録する関数"""
+    now = datetime.now().isoformat(timespec="seconds")
+    with closing(connect()) as conn, conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO notion_pages"
+            " (database_id, posting_key, page_id, page_url, content_hash, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (database_id, key, page_id, page_url, digest, now)
+        )
+
+def record_signatures(entries):
+    """ほぼ重複の検出に使う署名を記録する関数
+
+    entries は (キー, 比べる相手を絞るキー, インターン名, 開始予定日, 署名, 帯ごとのハッシュ値のリスト) のリスト。
+    同じキーの以前の署名は置き換える。
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+    with closing(connect()) as conn, conn:
+        conn.executemany(
+            "DELETE FROM signature_bands WHERE block_key = ? AND posting_key = ?",
+            [(block, key) for key, block, *_ in entries]
+        )
+        conn.executemany(
+            "INSERT OR REPLACE INTO posting_signatures"
+            " (posting_key, block_key, intern_name, start_date, signature, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            [(key, block, intern_name, start_date, sig, now) for key, block, intern_name, start_date, sig, _ in entries]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO signature_bands (block_key, band, band_hash, posting_key) VALUES (?, ?, ?, ?)",
+            [
+                (block, band, band_hash, key)
+                for key, block, _, _, _, hashes in entries
+                for band, band_hash in enumerate(hashes)
+            ]
+        )
+
+def lookup_signature_candidates(block, hashes):
+    """帯のハッシュ値が1つでも一致する署名を返す関数
+
+    戻り値は (キー, インターン名, 開始予定日, 署名) のリスト。
+    """
+    return lookup_signature_candidates_many([(block, hashes)])[0]
+
+def lookup_signature_candidates_many(queries):
+    """(ブロック, 帯のハッシュ値) ごとの lookup_signature_candidates を1回の接続でまとめて行う関数"""
+    with closing(connect()) as conn:
+        return [
+            conn.execute(
+                "SELECT posting_key, intern_name, start_date, signature FROM posting_signatures"
+                " WHERE posting_key IN (SELECT posting_key FROM signature_bands WHERE block_key = ? AND ("
+                + " OR ".join(["(band = ? AND band_hash = ?)"] * len(hashes)) + "))",
+                [block, *(value for band, band_hash in enumerate(hashes) for value in (band, band_hash))]
+            ).fetchall()
+            for block, hashes in queries
+        ]
@@ -0,0 +1,98 @@
+"""外部API（Google Sheets / Notion）の呼び出しのレート制限と再試行
+
+レート制限器はトークンバケット方式で、プロセス全体で共有して使う。
+429（Too Many Requests）と5xxの応答は、Retry-Afterヘッダーまたは
+ゆらぎ付きの指数バックオフで待ってから再試行する。
+"""
+import random
+import threading
+from time import monotonic, sleep
+
+import metrics
+
+def create_token_bucket(rate, capacity=None):
+    """トークンバケット方式のレート制限器を作成する関数（rate は1秒あたりに補充するトークン数で、0より大きい値）"""
+    if rate <= 0:
+        raise ValueError(f"レート制限の速さは0より大きい値にしてください: {rate}")
+    capacity = capacity or max(1.0, rate)
+    return {
+        "rate": rate,
+        "capacity": capacity,
+        "tokens": capacity,
+        "updated_at": monotonic(),
+        "lock": threading.Lock(),
+    }
+
+def create_per_minute_bucket(requests_per_minute):
+    """1分あたりの上限（クォータ）を超えないレート制限器を作成する関数
+
+    上限の1割までは続けて呼び出せ、残りは一定の間隔に均す。
+    どの1分間を取っても上限を超えないように、溜められる量と補充の速さを合わせて上限に収める。
+    上限が2回未満では残りが0以下になり補充が止まるので、上限の半分の速さで補充する。
+    """
+    if requests_per_minute <= 0:
+        raise ValueError(f"1分あたりの上限は0より大きい値にしてください: {requests_per_minute}")
+    burst = max(1.0, requests_per_minute * 0.1)
+    return create_token_bucket(max(requests_per_minute - burst, requests_per_minute / 2) / 60, burst)
+
+def acquire_token(bucket):
+    """トークンが1つ使えるようになるまで待ってから消費する関数"""
+    while True:
+        with bucket["lock"]:
+            now = monotonic()
+            bucket["tokens"] = min(
+                bucket["capacity"],
+                bucket["tokens"] + (now - bucket["updated_at"]) * bucket["rate"]
+            )
+            bucket["updated_at"] = now
+            if bucket["tokens"] >= 1:
+                bucket["tokens"] -= 1
+                return
+            wait = (1 - bucket["tokens"]) / bucket["rate"]
+        sleep(wait)
+
+def get_status(error):
+    """APIのエラーからHTTPステータスコードを取り出す関数（Notion と googleapiclient の両方に対応）"""
+    status = getattr(error, "status", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    try:
+        return int(status)
+    except (TypeError, ValueError):
+        return None
+
+def is_retryable(error, retry_server_errors=True):
+    """再試行すれば成功する見込みのあるエラー（429・5xx）かどうかを判定する関数
+
+    5xxは処理済みの可能性があるので、冪等でない操作では retry_server_errors=False にして429だけを再試行する。
+    """
+    status = get_status(error)
+    return status == 429 or (retry_server_errors and status is not None and status >= 500)
+
+def get_retry_after(error, attempt, max_seconds=30.0):
+    """再試行までの待ち時間（秒）を返す関数。Retry-Afterヘッダーがあればそれに従う"""
+    # Notion はレスポンスヘッダーを headers に、googleapiclient は resp に持っている
+    headers = getattr(error, "headers", None) or getattr(error, "resp", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        # ヘッダーがなければ指数バックオフ（ゆらぎ付き）
+        return min(max_seconds, 2 ** attempt) * (0.5 + random.random() / 2)
+
+def call_with_retry(function, rate_limiter, backend, operation, max_retries, max_backoff_seconds=30.0,
+                    retry_server_errors=True):
+    """レート制限を守って function() を呼び出し、429や5xxの場合は再試行する関数
+
+    冪等でない操作は retry_server_errors=False にすると、二重に処理されないよう429だけを再試行する。
+    呼び出しごとの所要時間・エラー・再試行は backend と operation ごとに記録する。
+    """
+    for attempt in range(max_retries + 1):
+        acquire_token(rate_limiter)
+        try:
+            with metrics.timed(backend, operation):
+                return function()
+        except Exception as e:
+            if not is_retryable(e, retry_server_errors) or attempt == max_retries:
+                raise
+            metrics.record_retry(backend, operation)
+            sleep(get_retry_after(e, attempt, max_backoff_seconds))
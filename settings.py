@@ -0,0 +1,28 @@
+"""設定値の取得
+
+設定はシークレット（.streamlit/secrets.toml）と環境変数のどちらでも指定できる。
+画面表示やGoogle APIには依存しないので、バッチ処理を含むどのモジュールからも使える。
+"""
+import json
+import os
+
+import streamlit as st
+
+def get_optional_secret(name):
+    """任意の設定値をシークレット（最上位 → gcp_service_account）または環境変数から取得する関数"""
+    try:
+        if name in st.secrets:
+            return st.secrets[name]
+        if "gcp_service_account" in st.secrets and name in st.secrets["gcp_service_account"]:
+            return st.secrets["gcp_service_account"][name]
+    except Exception:
+        # シークレットが未設定の場合は環境変数だけを見る
+        pass
+    return os.getenv(name)
+
+def get_optional_mapping(name):
+    """対応表の設定値を辞書で返す関数（シークレットではテーブル、環境変数ではJSONで指定する。未設定は空の辞書）"""
+    value = get_optional_secret(name) or {}
+    if isinstance(value, str):
+        value = json.loads(value)
+    return dict(value)
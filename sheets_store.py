@@ -0,0 +1,901 @@
+"""Googleスプレッドシートへのインターン情報の保存
+
+Sheets APIクライアントのプール・クォータに合わせたレート制限・シートの分割（シャーディング）を行い、
+ローカル索引を使って同じ内容の再保存をスキップする。
+Streamlitの画面がなくても使えるように、エラーは画面に表示せず戻り値のメッセージで返す。
+"""
+import json
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from time import monotonic
+
+import streamlit as st
+
+import intern_info
+import metrics
+import near_duplicates
+import posting
+import posting_index
+import ratelimit
+import sinks
+from settings import get_optional_mapping, get_optional_secret
+
+# Sheets APIのディスカバリードキュメントの保存先
+DISCOVERY_CACHE_DIR = os.getenv("DISCOVERY_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache"))
+DISCOVERY_CACHE_PATH = os.path.join(DISCOVERY_CACHE_DIR, "sheets_v4_discovery.json")
+DISCOVERY_URL = "https://sheets.googleapis.com/$discovery/rest?version=v4"
+
+def write_discovery_document(document):
+    """ディスカバリードキュメントをローカルに保存する関数（書き込み途中のファイルを残さない）"""
+    os.makedirs(DISCOVERY_CACHE_DIR, exist_ok=True)
+    tmp_path = f"{DISCOVERY_CACHE_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(document)
+    os.replace(tmp_path, DISCOVERY_CACHE_PATH)
+
+def load_discovery_document():
+    """ローカルに保存したディスカバリードキュメントを読み込む関数
+    
+    保存されていない場合はライブラリ同梱のものを保存して使う。どちらもなければ None。
+    """
+    if os.path.exists(DISCOVERY_CACHE_PATH):
+        with open(DISCOVERY_CACHE_PATH, encoding="utf-8") as f:
+            return f.read()
+    
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+    except ImportError:
+        # 同梱ドキュメントのない古いバージョン
+        return None
+    document = get_static_doc("sheets", "v4")
+    if document:
+        write_discovery_document(document)
+    return document
+
+def refresh_discovery_document():
+    """最新のディスカバリードキュメントを取得してローカルの保存内容を更新する関数"""
+    import urllib.request
+    
+    try:
+        with urllib.request.urlopen(DISCOVERY_URL, timeout=30) as response:
+            document = response.read().decode("utf-8")
+        # 壊れたドキュメントで保存内容を上書きしない
+        if json.loads(document).get("name") != "sheets":
+            return False, "取得したディスカバリードキュメントが不正です"
+        write_discovery_document(document)
+        # 次回の接続から新しいドキュメントを使う
+        get_discovery_document.clear()
+        clear_sheets_client_pool()
+        return True, "ディスカバリードキュメントを更新しました"
+    except Exception as e:
+        return False, f"ディスカバリードキュメントの更新に失敗しました: {str(e)}"
+
+# 同時に使うSheets APIクライアントの上限（セッションをまたいで共有）
+SHEETS_CLIENT_POOL_SIZE = 8
+# 1リクエストあたりのタイムアウト（秒）
+SHEETS_HTTP_TIMEOUT_SECONDS = 60
+
+def get_service_account_info():
+    """サービスアカウントの鍵情報を取得する関数
+    
+    シークレットの gcp_service_account を使い、シークレットがない環境（バッチ処理など）では
+    環境変数 GOOGLE_APPLICATION_CREDENTIALS で指定した鍵ファイルを読み込む。
+    """
+    try:
+        if "gcp_service_account" in st.secrets:
+            return dict(st.secrets["gcp_service_account"])
+    except Exception:
+        # シークレットが未設定の場合は鍵ファイルを探す
+        pass
+    path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+    if not path:
+        raise RuntimeError(
+            "サービスアカウントが設定されていません（シークレットの gcp_service_account または"
+            "環境変数 GOOGLE_APPLICATION_CREDENTIALS を設定してください）"
+        )
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+# アクセストークンの保存先（秘密鍵は保存しない）
+TOKEN_CACHE_PATH = os.getenv("SHEETS_TOKEN_CACHE_PATH", os.path.join(DISCOVERY_CACHE_DIR, "sheets_token.json"))
+# 保存済みのトークンの残りの有効期間がこれより短い場合は使わずに取り直す（秒）
+TOKEN_MIN_REMAINING_SECONDS = 300
+
+def utcnow():
+    """google-auth と同じ形式（タイムゾーンなしのUTC）の現在時刻を返す関数"""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def save_access_token(credentials):
+    """アクセストークンと有効期限をローカルに保存する関数
+    
+    サーバーを動かしているユーザーだけが読み書きできる権限で作成し、書き込み途中のファイルを残さない。
+    保存できなくてもトークンは使えるので、エラーにはしない。
+    """
+    if not credentials.token or not credentials.expiry:
+        return
+    tmp_path = f"{TOKEN_CACHE_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(TOKEN_CACHE_PATH), exist_ok=True)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({
+                "account": credentials.service_account_email,
+                "scopes": sorted(credentials.scopes or []),
+                "token": credentials.token,
+                "expiry": credentials.expiry.isoformat(),
+            }, f)
+        os.replace(tmp_path, TOKEN_CACHE_PATH)
+    except OSError as e:
+        print(f"アクセストークンを保存できませんでした: {str(e)}")
+
+def load_access_token(credentials):
+    """保存済みのアクセストークンを credentials に設定する関数（設定できたかを返す）
+    
+    同じサービスアカウント・同じスコープのもので、有効期限まで TOKEN_MIN_REMAINING_SECONDS 秒以上
+    残っている場合だけ使う。他のユーザーが書き込める・読めるファイルは信用しない。
+    """
+    try:
+        file_stat = os.stat(TOKEN_CACHE_PATH)
+        if hasattr(os, "getuid") and (file_stat.st_uid != os.getuid() or file_stat.st_mode & 0o077):
+            return False
+        with open(TOKEN_CACHE_PATH, encoding="utf-8") as f:
+            saved = json.load(f)
+        if saved["account"] != credentials.service_account_email:
+            return False
+        if saved["scopes"] != sorted(credentials.scopes or []):
+            return False
+        expiry = datetime.fromisoformat(saved["expiry"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return False
+    if (expiry - utcnow()).total_seconds() < TOKEN_MIN_REMAINING_SECONDS:
+        return False
+    credentials.token = saved["token"]
+    credentials.expiry = expiry
+    return True
+
+@st.cache_resource
+def get_google_credentials():
+    """サービスアカウントの認証情報を取得する関数（全クライアントで共有し、トークン更新も共有される）
+    
+    保存済みのアクセストークンがまだ有効なら、再起動後もトークンを取り直さずに使う。
+    トークンを取り直したときはローカルに保存し直す。
+    失敗した場合は例外になり、キャッシュされないので次の呼び出しで取得し直す。
+    """
+    from google.oauth2 import service_account
+    
+    credentials = service_account.Credentials.from_service_account_info(
+        get_service_account_info(),
+        scopes=["https://www.googleapis.com/auth/spreadsheets"]
+    )
+    load_access_token(credentials)
+    
+    refresh = credentials.refresh
+    
+    def refresh_and_save(request):
+        with metrics.timed("sheets", "token.refresh"):
+            refresh(request)
+        save_access_token(credentials)
+    
+    # 期限切れ・401のときに google-auth から呼ばれる更新処理で、新しいトークンを保存する
+    credentials.refresh = refresh_and_save
+    return credentials
+
+@st.cache_resource
+def get_discovery_document():
+    """ディスカバリードキュメントを1回だけ解析して返す関数"""
+    document = load_discovery_document()
+    return json.loads(document) if document else None
+
+# Google Sheets APIへの接続
+def get_google_sheets_service():
+    """Google Sheets APIサービスを新しく作成する関数
+    
+    httplib2の通信はスレッドセーフではないため、クライアントごとに専用の接続を持たせる。
+    通常は sheets_service() でプールから借りて使う。認証に失敗した場合は RuntimeError。
+    """
+    try:
+        import google_auth_httplib2
+        import httplib2
+        from googleapiclient.discovery import build, build_from_document
+        
+        credentials = get_google_credentials()
+        
+        # 接続はクライアント内で使い回される（keep-alive）
+        http = google_auth_httplib2.AuthorizedHttp(
+            credentials, http=httplib2.Http(timeout=SHEETS_HTTP_TIMEOUT_SECONDS)
+        )
+        
+        # ローカルのディスカバリードキュメントを使い、ネットワークからの取得を省く
+        document = get_discovery_document()
+        if document:
+            return build_from_document(document, http=http)
+        return build('sheets', 'v4', http=http, static_discovery=True)
+    except Exception as e:
+        raise RuntimeError(f"Google認証に失敗しました: {str(e)}") from e
+
+@st.cache_resource
+def get_sheets_client_pool():
+    """Sheets APIクライアントのプールを取得する関数（全セッションで共有）"""
+    return {
+        "idle": queue.LifoQueue(),
+        "slots": threading.BoundedSemaphore(SHEETS_CLIENT_POOL_SIZE),
+    }
+
+def clear_sheets_client_pool():
+    """プール内の待機中のクライアントを破棄する関数（次回から作り直される）"""
+    idle = get_sheets_client_pool()["idle"]
+    while True:
+        try:
+            idle.get_nowait()
+        except queue.Empty:
+            return
+
+@contextmanager
+def sheets_service():
+    """プールからSheets APIクライアントを借り、使い終わったら戻す
+    
+    同時に借りられるのは SHEETS_CLIENT_POOL_SIZE 個までで、それ以上は空くまで待つ。
+    認証に失敗した場合は RuntimeError。
+    """
+    pool = get_sheets_client_pool()
+    pool["slots"].acquire()
+    try:
+        try:
+            service = pool["idle"].get_nowait()
+        except queue.Empty:
+            service = get_google_sheets_service()
+        yield service
+        # 例外が起きたクライアントは接続の状態が分からないので戻さない
+        pool["idle"].put(service)
+    finally:
+        pool["slots"].release()
+
+# Sheets APIの1分あたりの上限（ユーザーごとの既定の読み込み・書き込みクォータ）
+SHEETS_READ_REQUESTS_PER_MINUTE = float(os.getenv("SHEETS_READ_REQUESTS_PER_MINUTE", "60"))
+SHEETS_WRITE_REQUESTS_PER_MINUTE = float(os.getenv("SHEETS_WRITE_REQUESTS_PER_MINUTE", "60"))
+# 読み込みのクォータを使う操作（それ以外は書き込み）
+SHEETS_READ_OPERATIONS = {"get", "values.get", "values.batchGet"}
+# 5xxでも再試行してよい操作（同じリクエストを2回送っても結果が変わらないもの）
+SHEETS_IDEMPOTENT_OPERATIONS = SHEETS_READ_OPERATIONS | {"values.update", "values.batchUpdate", "values.batchClear"}
+# 429（クォータ超過）や一時的なエラーを再試行する回数と、待ち時間の上限（秒）
+SHEETS_MAX_RETRIES = 5
+SHEETS_MAX_BACKOFF_SECONDS = 64
+
+@st.cache_resource
+def get_sheets_rate_limiters():
+    """Sheets API用のレート制限器を取得する関数（全セッション・全スレッドで共有）"""
+    return {
+        "read": ratelimit.create_per_minute_bucket(SHEETS_READ_REQUESTS_PER_MINUTE),
+        "write": ratelimit.create_per_minute_bucket(SHEETS_WRITE_REQUESTS_PER_MINUTE),
+    }
+
+def execute_sheets_request(request, operation):
+    """Sheets APIのリクエストを実行する関数
+    
+    読み込み・書き込みそれぞれのクォータに収まるように送信を待ち合わせ、
+    429や5xxの場合はバックオフして再試行する。values.append などの冪等でない操作は、
+    5xxでも書き込まれている可能性があるので429だけを再試行する。所要時間と成否は操作ごとに記録する。
+    """
+    rate_limiter = get_sheets_rate_limiters()["read" if operation in SHEETS_READ_OPERATIONS else "write"]
+    return ratelimit.call_with_retry(
+        request.execute, rate_limiter, "sheets", operation, SHEETS_MAX_RETRIES, SHEETS_MAX_BACKOFF_SECONDS,
+        retry_server_errors=operation in SHEETS_IDEMPOTENT_OPERATIONS
+    )
+
+# スプレッドシートの列定義（A〜U列）
+SHEET_HEADERS = posting.FIELDS
+SHEET_LAST_COLUMN = "U"
+
+def get_sheet_config():
+    """スプレッドシートIDとシート名を取得する関数
+    
+    シークレットの最上位 → gcp_service_account の中 → 環境変数 の順に探す。
+    """
+    # ハードコードバックアップ (テスト用)
+    spreadsheet_id = get_optional_secret("SPREADSHEET_ID") or "1SsUwD9XsadcfaxsefaMu49lx72iQxaefdaefA7KzvM"
+    sheet_name = get_optional_secret("SHEET_NAME") or "info"
+    return spreadsheet_id, sheet_name
+
+# シートの分割方法（設定名: インターン情報から分割先の名前を返す関数）
+SHARD_RULES = {
+    "業界": lambda info: str(info["業界"]),
+    "応募締切月": lambda info: str(info["応募締切"])[:7],
+}
+
+def get_shard_config():
+    """シートの分割設定を取得する関数
+    
+    SHARD_BY に SHARD_RULES の設定名（業界 / 応募締切月）を指定すると、インターン情報を
+    「シート名_分割先」（例: info_金融・保険、info_2025-06）のシートに振り分ける。
+    SHARD_SPREADSHEETS（分割先: スプレッドシートID）で分割先ごとに別のスプレッドシートも指定できる。
+    戻り値は (分割方法または None, {分割先: スプレッドシートID})。
+    """
+    shard_by = get_optional_secret("SHARD_BY") or None
+    if shard_by and shard_by not in SHARD_RULES:
+        raise ValueError(f"SHARD_BY に指定できない値です: {shard_by}（{'、'.join(SHARD_RULES)} のいずれか）")
+    return shard_by, get_optional_mapping("SHARD_SPREADSHEETS")
+
+def get_shard_target(info, spreadsheet_id, sheet_name, shard_config):
+    """インターン情報の保存先の (スプレッドシートID, シート名) を返す関数"""
+    shard_by, shard_spreadsheets = shard_config
+    if not shard_by:
+        return spreadsheet_id, sheet_name
+    shard = SHARD_RULES[shard_by](info).strip()
+    if not shard:
+        return spreadsheet_id, sheet_name
+    return shard_spreadsheets.get(shard, spreadsheet_id), f"{sheet_name}_{shard}"
+
+def a1_range(sheet_name, cells):
+    """シート名を引用符で囲んだA1形式の範囲を返す関数（記号を含む分割先のシート名でも使えるように）"""
+    return "'" + sheet_name.replace("'", "''") + "'!" + cells
+
+# シート一覧のキャッシュ有効期間（秒）
+SHEET_STATE_TTL_SECONDS = 600
+# シートが見つからないときに一覧を取り直す場合でも、この秒数以内に取得したものは使い回す
+SHEET_STATE_REFRESH_SECONDS = 5
+
+@st.cache_resource
+def get_sheet_state_cache():
+    """スプレッドシートごとのシート一覧をプロセス全体（全セッション）で共有するキャッシュを取得する関数"""
+    # titles のキー: スプレッドシートID / 値: (取得した時刻, シート名の集合)
+    # fetch_locks: 同じスプレッドシートの一覧を複数のスレッドが同時に取得しないためのロック
+    return {"lock": threading.Lock(), "titles": {}, "fetch_locks": {}}
+
+def invalidate_sheet_state(spreadsheet_id, sheet_name=None):
+    """シート一覧のキャッシュを破棄する関数"""
+    cache = get_sheet_state_cache()
+    with cache["lock"]:
+        cache["titles"].pop(spreadsheet_id, None)
+
+def get_sheet_titles(service, spreadsheet_id, max_age=SHEET_STATE_TTL_SECONDS):
+    """スプレッドシート内のシート名の集合を返す関数（max_age 秒以内に取得したものがあればAPIは呼ばない）
+    
+    分割先のシートがいくつあっても、1回の取得ですべての確認に使える。
+    """
+    cache = get_sheet_state_cache()
+    with cache["lock"]:
+        fetch_lock = cache["fetch_locks"].setdefault(spreadsheet_id, threading.Lock())
+    with fetch_lock:
+        with cache["lock"]:
+            entry = cache["titles"].get(spreadsheet_id)
+        if entry is not None and monotonic() - entry[0] < max_age:
+            return entry[1]
+        
+        # シート情報を取得（シート名だけに絞る）
+        sheet_metadata = execute_sheets_request(service.spreadsheets().get(
+            spreadsheetId=spreadsheet_id,
+            fields="sheets.properties.title"
+        ), "get")
+        titles = {sheet['properties']['title'] for sheet in sheet_metadata.get('sheets', [])}
+        with cache["lock"]:
+            cache["titles"][spreadsheet_id] = (monotonic(), titles)
+        return titles
+
+@st.cache_resource
+def get_sheet_write_locks():
+    """シートごとの書き込みロックをプロセス全体（全セッション）で共有する登録簿を取得する関数"""
+    # locks のキー: (スプレッドシートID, シート名)
+    return {"lock": threading.Lock(), "locks": {}}
+
+def sheet_write_lock(spreadsheet_id, sheet_name):
+    """シートへの書き込みロックを返す関数
+    
+    索引の照合から書き込み・索引への記録までをこのロックの中で行い、同じインターン情報を
+    同時に保存しても両方が新規として追記されないようにする。
+    """
+    registry = get_sheet_write_locks()
+    with registry["lock"]:
+        return registry["locks"].setdefault((spreadsheet_id, sheet_name), threading.Lock())
+
+def list_shard_sheets(service, spreadsheet_id, sheet_name, shard_config):
+    """保存済みのインターン情報があるシートを (スプレッドシートID, シート名) のリストで返す関数
+    
+    分割しない場合はAPIを呼ばずに設定のシートだけを返す。分割する場合は、分割前のシートと
+    「シート名_分割先」のシートをすべて返す（シート一覧はキャッシュを使う）。
+    """
+    shard_by, shard_spreadsheets = shard_config
+    if not shard_by:
+        return [(spreadsheet_id, sheet_name)]
+    targets = []
+    for target_id in dict.fromkeys([spreadsheet_id, *shard_spreadsheets.values()]):
+        targets += [
+            (target_id, title) for title in sorted(get_sheet_titles(service, target_id))
+            if title == sheet_name or title.startswith(f"{sheet_name}_")
+        ]
+    return targets
+
+def remember_sheet_title(spreadsheet_id, sheet_name):
+    """作成したシートをシート一覧のキャッシュに加える関数"""
+    cache = get_sheet_state_cache()
+    with cache["lock"]:
+        entry = cache["titles"].get(spreadsheet_id)
+        if entry is not None:
+            entry[1].add(sheet_name)
+
+def is_range_error(error):
+    """シートが見つからない等の範囲エラーかどうかを判定する関数"""
+    resp = getattr(error, "resp", None)
+    return getattr(resp, "status", None) == 400 and "Unable to parse range" in str(error)
+
+def ensure_sheet(service, spreadsheet_id, sheet_name):
+    """シートが存在しない場合は作成してヘッダー行を書き込む関数"""
+    # 有効期間内のシート一覧に含まれていればAPIは呼ばない
+    if sheet_name in get_sheet_titles(service, spreadsheet_id):
+        return
+    # 他のプロセスが作成した可能性があるので一覧を取り直す
+    if sheet_name in get_sheet_titles(service, spreadsheet_id, max_age=SHEET_STATE_REFRESH_SECONDS):
+        return
+    
+    # シートが存在しない場合は作成
+    try:
+        execute_sheets_request(service.spreadsheets().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={
+                'requests': [{
+                    'addSheet': {
+                        'properties': {
+                            'title': sheet_name
+                        }
+                    }
+                }]
+            }
+        ), "batchUpdate")
+    except Exception as e:
+        # 同時に保存した別のスレッドが先に作成した場合（ヘッダー行もそちらで書き込まれる）
+        if "already exists" not in str(e):
+            raise
+        remember_sheet_title(spreadsheet_id, sheet_name)
+        return
+    
+    # ヘッダー行を書き込む
+    execute_sheets_request(service.spreadsheets().values().update(
+        spreadsheetId=spreadsheet_id,
+        range=a1_range(sheet_name, f"A1:{SHEET_LAST_COLUMN}1"),
+        valueInputOption='RAW',
+        body={'values': [SHEET_HEADERS]}
+    ), "values.update")
+    remember_sheet_title(spreadsheet_id, sheet_name)
+
+def info_to_row(info):
+    """インターン情報をスプレッドシートの1行分の値に変換する関数（レコードの列順がそのまま列順になる）"""
+    return list(posting.from_mapping(info))
+
+def parse_first_row(updated_range):
+    """A1形式の範囲（例: info!A12:U14）から先頭の行番号を取得する関数"""
+    cells = updated_range.rsplit("!", 1)[-1].split(":")[0]
+    digits = "".join(c for c in cells if c.isdigit())
+    return int(digits) if digits else None
+
+# サーバー起動時に事前準備（warm_up）を行うか（0 で行わない）
+SHEETS_WARM_UP = os.getenv("SHEETS_WARM_UP", "1") != "0"
+
+def warm_up():
+    """最初の保存を待たずに、認証情報・アクセストークン・APIクライアント・シート一覧を用意しておく関数
+    
+    作成したクライアントはプールに戻るので、最初の保存はそれを借りて使う。
+    戻り値は (成功したか, メッセージ)。
+    """
+    try:
+        with metrics.timed("sheets", "warm_up"):
+            import google_auth_httplib2
+            import httplib2
+            
+            credentials = get_google_credentials()
+            if not credentials.valid:
+                credentials.refresh(google_auth_httplib2.Request(httplib2.Http(timeout=SHEETS_HTTP_TIMEOUT_SECONDS)))
+            spreadsheet_id, _ = get_sheet_config()
+            _, shard_spreadsheets = get_shard_config()
+            with sheets_service() as service:
+                for target_id in dict.fromkeys([spreadsheet_id, *shard_spreadsheets.values()]):
+                    get_sheet_titles(service, target_id)
+        return True, "Google Sheets APIの準備ができました"
+    except Exception as e:
+        return False, f"Google Sheets APIの事前準備に失敗しました: {str(e)}"
+
+def save_many_to_sheets(infos):
+    """複数のインターン情報をまとめてGoogleスプレッドシートに保存する関数
+    
+    分割設定（SHARD_BY）がある場合は分割先のシートごとにまとめ、各シートへ同時に保存する。
+    業界や応募締切月が変わって分割先が変わったものは、新しい分割先に保存してから以前の分割先の行を消去する。
+    戻り値は infos と同じ順序の (成功したか, メッセージ) のリスト。
+    """
+    infos = list(infos)
+    if not infos:
+        return []
+    try:
+        spreadsheet_id, sheet_name = get_sheet_config()
+        shard_config = get_shard_config()
+    except Exception as e:
+        return [(False, f"スプレッドシートへの保存に失敗しました: {str(e)}")] * len(infos)
+    
+    shards = {}
+    targets = [None] * len(infos)
+    for i, info in enumerate(infos):
+        try:
+            target = get_shard_target(info, spreadsheet_id, sheet_name, shard_config)
+        except (KeyError, TypeError):
+            # 項目が足りないものは保存時にその行だけ失敗になる
+            target = (spreadsheet_id, sheet_name)
+        targets[i] = target
+        shards.setdefault(target, []).append(i)
+    try:
+        # 業界や応募締切月が変わったインターン情報は、保存前に以前の分割先の行を探しておく
+        stale_rows = find_stale_shard_rows(infos, targets, spreadsheet_id, sheet_name, shard_config)
+    except Exception as e:
+        return [(False, f"スプレッドシートへの保存に失敗しました: {str(e)}")] * len(infos)
+    
+    if len(shards) == 1:
+        (target, _), = shards.items()
+        results = save_many_to_sheet(infos, *target)
+    else:
+        shard_results = sinks.fan_out({
+            target: (lambda target=target, indices=indices: save_many_to_sheet([infos[i] for i in indices], *target))
+            for target, indices in shards.items()
+        })
+        results = [None] * len(infos)
+        for target, indices in shards.items():
+            saved = shard_results[target]
+            if isinstance(saved, Exception):
+                saved = [(False, f"予期せぬエラーが発生しました: {str(saved)}")] * len(indices)
+            for i, result in zip(indices, saved):
+                results[i] = result
+    
+    # 新しい分割先に保存できたものだけ、以前の分割先の行を消去する
+    moved = {}
+    for i, rows in stale_rows.items():
+        if results[i][0]:
+            for location, row_number in rows:
+                moved.setdefault(location, []).append((i, row_number))
+    for (target_id, target_name), rows in moved.items():
+        try:
+            clear_stale_rows(target_id, target_name, [(posting_index.posting_key(infos[i]), row_number) for i, row_number in rows])
+            note = f"（以前の保存先「{target_name}」の行は消去しました）"
+        except Exception as e:
+            note = f"（以前の保存先「{target_name}」の行を消去できませんでした: {str(e)}）"
+        for i, _ in rows:
+            results[i] = (True, results[i][1] + note)
+    return results
+
+def find_stale_shard_rows(infos, targets, spreadsheet_id, sheet_name, shard_config):
+    """保存先とは別の分割先に保存済みの行を探す関数
+    
+    分割しない場合は何も返さない。分割する場合は索引から同じキーの行を探し、
+    分割前のシートと「シート名_分割先」のシートのうち、今回の保存先以外にあるものを返す。
+    戻り値は {infos の位置: [((スプレッドシートID, シート名), 行番号)]}。
+    """
+    shard_by, shard_spreadsheets = shard_config
+    if not shard_by:
+        return {}
+    keys = {}
+    for i, info in enumerate(infos):
+        keys.setdefault(posting_index.posting_key(info), []).append(i)
+    shard_spreadsheet_ids = {spreadsheet_id, *shard_spreadsheets.values()}
+    stale = {}
+    for key, locations in posting_index.lookup_sheet_locations(keys).items():
+        # 同じバッチ内で同じキーが複数ある場合は後のものが保存される
+        i = keys[key][-1]
+        rows = [
+            ((target_id, target_name), row_number)
+            for target_id, target_name, row_number in locations
+            if (target_id, target_name) != targets[i]
+            and target_id in shard_spreadsheet_ids
+            and (target_name == sheet_name or target_name.startswith(f"{sheet_name}_"))
+        ]
+        if rows:
+            stale[i] = rows
+    return stale
+
+def clear_stale_rows(spreadsheet_id, sheet_name, rows):
+    """別の分割先に移ったインターン情報の古い行を消去する関数（rows: (キー, 行番号) のリスト）
+    
+    行を削除すると下の行の行番号がずれて索引と合わなくなるため、値だけを消して空行にする
+    （空行は読み込み時に飛ばされる）。消去する前に行がまだ同じインターン情報か確認し、
+    手作業で動かされていた行には触れない。どちらの場合も索引からは削除する。
+    """
+    with sheet_write_lock(spreadsheet_id, sheet_name), sheets_service() as service:
+        current = execute_sheets_request(service.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id,
+            ranges=[a1_range(sheet_name, f"A{row_number}:{SHEET_LAST_COLUMN}{row_number}") for _, row_number in rows]
+        ), "values.batchGet")
+        ranges = [
+            a1_range(sheet_name, f"A{row_number}:{SHEET_LAST_COLUMN}{row_number}")
+            for (key, row_number), value_range in zip(rows, current.get('valueRanges', []))
+            if posting_index.posting_key(posting.from_row((value_range.get('values') or [[]])[0])) == key
+        ]
+        if ranges:
+            execute_sheets_request(service.spreadsheets().values().batchClear(
+                spreadsheetId=spreadsheet_id,
+                body={'ranges': ranges}
+            ), "values.batchClear")
+        posting_index.forget_sheet_rows(spreadsheet_id, sheet_name, [key for key, _ in rows])
+
+def update_known_rows(service, spreadsheet_id, sheet_name, pending, updates, results):
+    """索引に記録された行をまとめて上書きする関数（save_many_to_sheet から呼び出す）
+    
+    updates は {キー: 行番号}。上書きする前に行がまだ同じインターン情報か確認し（手作業で行が動いた場合に備える）、
+    位置が分からなくなった行は索引から削除して updates から除く（呼び出し元で新規として追加し直す）。
+    上書きした行は results に結果を入れ、索引に記録する。
+    """
+    current = execute_sheets_request(service.spreadsheets().values().batchGet(
+        spreadsheetId=spreadsheet_id,
+        ranges=[a1_range(sheet_name, f"A{row_number}:{SHEET_LAST_COLUMN}{row_number}") for row_number in updates.values()]
+    ), "values.batchGet")
+    moved = []
+    for key, value_range in zip(list(updates), current.get('valueRanges', [])):
+        values = (value_range.get('values') or [[]])[0]
+        if posting_index.posting_key(posting.from_row(values)) != key:
+            moved.append(key)
+            del updates[key]
+    if moved:
+        posting_index.forget_sheet_rows(spreadsheet_id, sheet_name, moved)
+    if not updates:
+        return
+    
+    execute_sheets_request(service.spreadsheets().values().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={
+            'valueInputOption': 'RAW',
+            'data': [
+                {
+                    'range': a1_range(sheet_name, f"A{row_number}:{SHEET_LAST_COLUMN}{row_number}"),
+                    'values': [pending[key]["row"]]
+                }
+                for key, row_number in updates.items()
+            ]
+        }
+    ), "values.batchUpdate")
+    saved = []
+    for key, row_number in updates.items():
+        entry = pending[key]
+        results[entry["index"]] = (True, f"スプレッドシートの{row_number}行目を更新しました")
+        saved.append((key, row_number, entry["hash"]))
+    posting_index.record_sheet_rows(spreadsheet_id, sheet_name, saved)
+
+def save_many_to_sheet(infos, spreadsheet_id, sheet_name):
+    """複数のインターン情報を1つのシートにまとめて保存する関数
+    
+    シートの確認とヘッダー作成はまとめて1回だけ行い、全行を1回のリクエストで書き込む。
+    ローカル索引に同じ内容が記録されている行はAPIを呼ばずにスキップし、
+    内容が変わった行は既知の行を上書きする。索引の照合から記録まではシートごとのロックの中で行う。
+    戻り値は infos と同じ順序の (成功したか, メッセージ) のリスト。
+    """
+    infos = list(infos)
+    if not infos:
+        return []
+    
+    # 各行を変換し、変換できなかった行はその行だけ失敗にする
+    results = [None] * len(infos)
+    pending = {}
+    for i, info in enumerate(infos):
+        try:
+            row = info_to_row(info)
+        except (KeyError, TypeError) as e:
+            results[i] = (False, f"必須項目が不足しています: {str(e)}")
+            continue
+        key = posting_index.posting_key(info)
+        if key in pending:
+            # 同じバッチ内で同じキーが複数ある場合は後のものを保存する
+            results[pending[key]["index"]] = (True, "同じインターン情報が後に続くため、そちらを保存します")
+        pending[key] = {"index": i, "row": row, "hash": posting_index.content_hash(info)}
+    
+    if not pending:
+        return results
+    
+    def fail_all(message):
+        # 既に結果が決まった行（スキップ・更新済み）はそのままにする
+        for entry in pending.values():
+            if results[entry["index"]] is None:
+                results[entry["index"]] = (False, message)
+        return results
+    
+    try:
+        with sheet_write_lock(spreadsheet_id, sheet_name):
+            try:
+                # 索引と照合し、同じ内容のものはAPIを呼ばずにスキップする
+                known_rows = posting_index.lookup_sheet_rows(spreadsheet_id, sheet_name, pending)
+                updates = {}
+                for key, (row_number, digest) in known_rows.items():
+                    entry = pending[key]
+                    if digest == entry["hash"]:
+                        results[entry["index"]] = (True, f"同じ内容が{row_number}行目に保存済みのためスキップしました")
+                        del pending[key]
+                    else:
+                        updates[key] = row_number
+                if not pending:
+                    return results
+                
+                with sheets_service() as service:
+                    # シートが存在するか確認（バッチごとに1回）
+                    try:
+                        ensure_sheet(service, spreadsheet_id, sheet_name)
+                    except Exception as e:
+                        return fail_all(f"シート確認中にエラーが発生しました: {str(e)}")
+                    
+                    saved = []
+                    
+                    if updates:
+                        try:
+                            update_known_rows(service, spreadsheet_id, sheet_name, pending, updates, results)
+                        except Exception as e:
+                            if not is_range_error(e):
+                                raise
+                            # シートが削除・改名された場合はキャッシュを破棄して作り直し、既知の行も新規として追加し直す
+                            invalidate_sheet_state(spreadsheet_id, sheet_name)
+                            ensure_sheet(service, spreadsheet_id, sheet_name)
+                            posting_index.forget_sheet_rows(spreadsheet_id, sheet_name, list(updates))
+                            updates = {}
+                    
+                    appends = [key for key in pending if key not in updates]
+                    if appends:
+                        # 末尾への追記はサーバー側に任せる（既存データはダウンロードしない）
+                        append_request = service.spreadsheets().values().append(
+                            spreadsheetId=spreadsheet_id,
+                            range=a1_range(sheet_name, f"A:{SHEET_LAST_COLUMN}"),
+                            valueInputOption='RAW',
+                            insertDataOption='INSERT_ROWS',
+                            includeValuesInResponse=False,
+                            body={'values': [pending[key]["row"] for key in appends]}
+                        )
+                        try:
+                            result = execute_sheets_request(append_request, "values.append")
+                        except Exception as e:
+                            if not is_range_error(e):
+                                raise
+                            # シートが削除・改名された場合はキャッシュを破棄して作り直す
+                            invalidate_sheet_state(spreadsheet_id, sheet_name)
+                            ensure_sheet(service, spreadsheet_id, sheet_name)
+                            metrics.record_retry("sheets", "values.append")
+                            result = execute_sheets_request(append_request, "values.append")
+                        
+                        # 書き込まれた範囲（例: info!A12:U14）から先頭の行番号を取得
+                        first_row = parse_first_row(result.get('updates', {}).get('updatedRange', ''))
+                        
+                        for offset, key in enumerate(appends):
+                            entry = pending[key]
+                            if first_row:
+                                results[entry["index"]] = (True, f"スプレッドシートの{first_row + offset}行目に保存しました")
+                                saved.append((key, first_row + offset, entry["hash"]))
+                            else:
+                                results[entry["index"]] = (True, "スプレッドシートに保存しました")
+                    
+                    posting_index.record_sheet_rows(spreadsheet_id, sheet_name, saved)
+                    # 書き込んだものはほぼ重複の検出で比べる相手になる
+                    near_duplicates.record_postings(infos[entry["index"]] for entry in pending.values())
+                    return results
+            except Exception as e:
+                return fail_all(f"スプレッドシートへの保存に失敗しました: {str(e)}")
+    except Exception as e:
+        return fail_all(f"予期せぬエラーが発生しました: {str(e)}")
+
+def save_to_sheets(info):
+    """Googleスプレッドシートに情報を保存する関数"""
+    return save_many_to_sheets([info])[0]
+
+# 全件を読み込む場合に1回に読み込む行数
+SHEET_PAGE_ROWS = 1000
+
+def get_sheet_row_count(service, spreadsheet_id, sheet_name):
+    """シートの行数（末尾の空行も含むグリッドの行数）を返す関数"""
+    metadata = execute_sheets_request(service.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        ranges=[a1_range(sheet_name, "A1")],
+        fields="sheets.properties.gridProperties.rowCount"
+    ), "get")
+    sheets = metadata.get('sheets', [])
+    return sheets[0]['properties']['gridProperties']['rowCount'] if sheets else 0
+
+def iter_sheet_postings(template_name=None, page_rows=SHEET_PAGE_ROWS):
+    """スプレッドシート上の全インターン情報を1件ずつ返すジェネレーター
+    
+    分割先のすべてのシートを page_rows 行ずつ読み込み、説明は生成時と同じテンプレートで描画し直す
+    （説明列は読み込まない）。APIは範囲の末尾の空行を返さないので、ページが短くてもシートの終わりとはみなさず、
+    シートの行数まで読み込む。読み込み中のページ以外は保持しないので、件数が増えても使用メモリはほぼ一定。
+    クライアントはページごとに借りて返すので、出力先が遅くても他の保存を妨げない。
+    """
+    spreadsheet_id, sheet_name = get_sheet_config()
+    shard_config = get_shard_config()
+    renderers = intern_info.get_template_renderers()
+    with sheets_service() as service:
+        targets = list_shard_sheets(service, spreadsheet_id, sheet_name, shard_config)
+    
+    # 説明列（最終列）の手前まで
+    last_field_column = chr(ord('A') + len(SHEET_HEADERS) - 2)
+    for target_id, target_name in targets:
+        with sheets_service() as service:
+            row_count = get_sheet_row_count(service, target_id, target_name)
+        start_row = 2
+        while start_row <= row_count:
+            with sheets_service() as service:
+                result = execute_sheets_request(service.spreadsheets().values().get(
+                    spreadsheetId=target_id,
+                    range=a1_range(target_name, f"A{start_row}:{last_field_column}{start_row + page_rows - 1}")
+                ), "values.get")
+            rows = result.get('values', [])
+            for row in rows:
+                # 途中の空行は飛ばす
+                if not any(row):
+                    continue
+                info = posting.from_row(row)
+                yield info._replace(説明=renderers[intern_info.resolve_template_name(info["企業名"], template_name)](info))
+            start_row += page_rows
+
+def regenerate_descriptions_in_sheet(service, spreadsheet_id, sheet_name, template_name=None, page_rows=SHEET_PAGE_ROWS):
+    """1つのシートの全インターン情報の説明文を作り直し、再生成した件数を返す関数
+    
+    iter_sheet_postings と同じく page_rows 行ずつ読み込み、ページごとに1回のリクエストで書き戻す
+    （1回のリクエストの大きさも page_rows 行までになる）。途中の空行は空のレコードとして説明を書き込まないように飛ばし、
+    空行以外の連続した行ごとに書き込む。書き戻した行は索引の内容のハッシュ値も新しい説明に合わせて記録し直す
+    （古いハッシュ値のままだと、次に保存したときに保存済みとしてスキップされない）。
+    """
+    # 説明列（最終列）の手前までを読み込む
+    last_field_column = chr(ord('A') + len(SHEET_HEADERS) - 2)
+    row_count = get_sheet_row_count(service, spreadsheet_id, sheet_name)
+    total = 0
+    start_row = 2
+    while start_row <= row_count:
+        result = execute_sheets_request(service.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id,
+            range=a1_range(sheet_name, f"A{start_row}:{last_field_column}{start_row + page_rows - 1}")
+        ), "values.get")
+        # 空行（途中の空行は [] で返ってくる）を除いた行番号とレコード
+        # 末尾の空欄は返ってこないので列数をそろえる（説明は空欄として読み込む）
+        numbered = [
+            (row_number, posting.from_row(row))
+            for row_number, row in enumerate(result.get('values', []), start_row) if any(row)
+        ]
+        start_row += page_rows
+        if not numbered:
+            continue
+        descriptions = intern_info.render_descriptions([info for _, info in numbered], template_name)
+        
+        # 連続した行ごとに1つの範囲にまとめる
+        data = []
+        for (row_number, _), description in zip(numbered, descriptions):
+            if data and data[-1]["end"] == row_number - 1:
+                data[-1]["end"] = row_number
+                data[-1]["values"].append([description])
+            else:
+                data.append({"start": row_number, "end": row_number, "values": [[description]]})
+        execute_sheets_request(service.spreadsheets().values().batchUpdate(
+            spreadsheetId=spreadsheet_id,
+            body={
+                'valueInputOption': 'RAW',
+                'data': [
+                    {
+                        'range': a1_range(sheet_name, f"{SHEET_LAST_COLUMN}{run['start']}:{SHEET_LAST_COLUMN}{run['end']}"),
+                        'values': run["values"]
+                    }
+                    for run in data
+                ]
+            }
+        ), "values.batchUpdate")
+        posting_index.record_sheet_rows(spreadsheet_id, sheet_name, [
+            (posting_index.posting_key(info), row_number, posting_index.content_hash(info._replace(説明=description)))
+            for (row_number, info), description in zip(numbered, descriptions)
+        ])
+        total += len(numbered)
+    return total
+
+def regenerate_sheet_descriptions(template_name=None):
+    """スプレッドシート上の全インターン情報の説明文をテンプレートで作り直す関数
+    
+    シートごとに説明以外の列をページ単位で読み込み、描画した説明文をページごとに説明列へ書き戻す。
+    分割設定がある場合は分割先のすべてのシートが対象になる。
+    戻り値は (成功したか, メッセージ)。
+    """
+    try:
+        spreadsheet_id, sheet_name = get_sheet_config()
+        shard_config = get_shard_config()
+        with sheets_service() as service:
+            total = sum(
+                regenerate_descriptions_in_sheet(service, target_id, target_name, template_name)
+                for target_id, target_name in list_shard_sheets(service, spreadsheet_id, sheet_name, shard_config)
+            )
+        if not total:
+            return True, "再生成するインターン情報がありません"
+        return True, f"{total}件の説明を再生成しました"
+    except Exception as e:
+        return False, f"説明の再生成に失敗しました: {str(e)}"
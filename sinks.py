@@ -0,0 +1,171 @@
+"""インターン情報の保存先（シンク）
+
+Googleスプレッドシート・Notion・ローカルのCSV / JSONLファイルを同じインターフェースで扱い、
+1件または複数件のインターン情報を有効なすべての保存先に同時に保存する。
+保存にかかる時間は、各保存先の合計ではなく最も遅い保存先の時間になる。
+"""
+import csv
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import outbox
+import posting
+
+# ローカルファイルに保存する場合の保存先ディレクトリ
+LOCAL_SINK_DIR = os.getenv(
+    "LOCAL_SINK_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exports")
+)
+
+SINK_CSV = "csv"
+SINK_JSONL = "jsonl"
+
+class Sink:
+    """保存先の基底クラス
+
+    name は送信箱（outbox）で保存先を区別する名前、label は画面に表示する名前。
+    save_many は infos と同じ順序の (成功したか, メッセージ) のリストを返す。
+    """
+    name = ""
+    label = ""
+    # 送信箱から1回に取り出す件数
+    batch_size = 500
+
+    def save_many(self, infos):
+        raise NotImplementedError
+
+class SheetsSink(Sink):
+    """Googleスプレッドシートに保存するクラス（送信箱から1回に取り出す件数を1回の書き込みにまとめる）"""
+    name = outbox.SINK_SHEETS
+    label = "Googleスプレッドシート"
+
+    def save_many(self, infos):
+        from sheets_store import save_many_to_sheets
+        return save_many_to_sheets(infos)
+
+class NotionSink(Sink):
+    """Notionデータベースに保存するクラス"""
+    name = outbox.SINK_NOTION
+    label = "Notion"
+    batch_size = 50
+
+    def save_many(self, infos):
+        from notion_store import create_notion_pages
+        return create_notion_pages(infos)
+
+# ファイルごとの書き込みロック（同じファイルへの同時書き込みで行が混ざらないようにする）
+_file_locks = {}
+_file_locks_lock = threading.Lock()
+
+def _file_lock(path):
+    with _file_locks_lock:
+        return _file_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+class CsvSink(Sink):
+    """ローカルのCSVファイルに追記するクラス（Excelで開けるようにBOM付きUTF-8で書き込む）
+
+    列はインターン情報のレコードの列順（スプレッドシートと同じ）。
+    """
+    name = SINK_CSV
+    label = "CSV"
+
+    def __init__(self, path):
+        self.path = path
+
+    def save_many(self, infos):
+        infos = list(infos)
+        if not infos:
+            return []
+        try:
+            rows = [posting.from_mapping(info) for info in infos]
+        except KeyError as e:
+            return [(False, f"必須項目が不足しています: {str(e)}")] * len(infos)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with _file_lock(self.path), open(self.path, "a", encoding="utf-8-sig", newline="") as f:
+                writer = csv.writer(f)
+                if f.tell() == 0:
+                    writer.writerow(posting.FIELDS)
+                writer.writerows(rows)
+        except OSError as e:
+            return [(False, f"CSVファイルへの書き込みに失敗しました: {str(e)}")] * len(infos)
+        return [(True, f"{self.path} に保存しました")] * len(infos)
+
+class JsonlSink(Sink):
+    """ローカルのJSON Linesファイルに追記するクラス"""
+    name = SINK_JSONL
+    label = "JSONL"
+
+    def __init__(self, path):
+        self.path = path
+
+    def save_many(self, infos):
+        infos = list(infos)
+        if not infos:
+            return []
+        try:
+            lines = "".join(
+                json.dumps(posting.from_mapping(info)._asdict(), ensure_ascii=False, default=str) + "\n"
+                for info in infos
+            )
+        except KeyError as e:
+            return [(False, f"必須項目が不足しています: {str(e)}")] * len(infos)
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with _file_lock(self.path), open(self.path, "a", encoding="utf-8") as f:
+                f.write(lines)
+        except OSError as e:
+            return [(False, f"JSONLファイルへの書き込みに失敗しました: {str(e)}")] * len(infos)
+        return [(True, f"{self.path} に保存しました")] * len(infos)
+
+def get_local_sinks():
+    """環境変数 LOCAL_SINKS（例: csv,jsonl）で有効にしたローカルファイルの保存先を返す関数"""
+    names = [name.strip().lower() for name in os.getenv("LOCAL_SINKS", "").split(",") if name.strip()]
+    local_sinks = []
+    if SINK_CSV in names:
+        local_sinks.append(CsvSink(os.path.join(LOCAL_SINK_DIR, "postings.csv")))
+    if SINK_JSONL in names:
+        local_sinks.append(JsonlSink(os.path.join(LOCAL_SINK_DIR, "postings.jsonl")))
+    return local_sinks
+
+def get_enabled_sinks():
+    """有効な保存先のリストを返す関数
+
+    スプレッドシートは常に有効。Notionはトークンとデータベースが設定されている場合、
+    ローカルファイルは環境変数 LOCAL_SINKS（例: csv,jsonl）で指定した場合に有効になる。
+    """
+    from notion_store import is_configured
+
+    enabled = [SheetsSink()]
+    if is_configured():
+        enabled.append(NotionSink())
+    return enabled + get_local_sinks()
+
+def fan_out(tasks):
+    """保存先ごとの処理を同時に実行する関数
+
+    tasks は {保存先の名前: 引数なしの関数}。戻り値は {保存先の名前: 関数の戻り値}。
+    例外が出た場合は戻り値の代わりにその例外が入る。
+    """
+    if not tasks:
+        return {}
+    with ThreadPoolExecutor(max_workers=len(tasks), thread_name_prefix="sink") as executor:
+        futures = {name: executor.submit(task) for name, task in tasks.items()}
+    return {name: future.exception() or future.result() for name, future in futures.items()}
+
+def dispatch(sink_list, infos):
+    """インターン情報をすべての保存先に同時に保存する関数
+
+    戻り値は {保存先の名前: infos と同じ順序の (成功したか, メッセージ) のリスト}。
+    """
+    infos = list(infos)
+    results = fan_out({sink.name: (lambda sink=sink: sink.save_many(infos)) for sink in sink_list})
+    return {
+        name: (
+            [(False, f"予期せぬエラーが発生しました: {str(result)}")] * len(infos)
+            if isinstance(result, Exception) else result
+        )
+        for name, result in results.items()
+    }